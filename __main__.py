@@ -1,32 +1,29 @@
-import time
 import shutil
 import os
-from file1 import process_aspect
-from file2_new import process_raster
-from file4 import process_union_clip
-from cleann import runnn
-from full_building import generate_complete_building_model
-from separate_obj import split_obj_by_shapefile
-from make_solid import make_obj_solid
-from tocityjson import obj_to_cityjson
+from pipeline import run_pipeline, run_sharded_pipeline
+from incremental import run_incremental
+from metrics import Metrics, set_progress
 
 # UBAH BAGIAN INI
 ohm_path = './input/OHM_FT_Fix.tif'
 building_outline_path = './input/BO_FT.shp'
 epsg = 32749
 output_cityjson = './output/Teknik-with-remove-ver.json'
+checkpoint_folder = None  # isi path folder (mis. './checkpoint') untuk menyimpan hasil antara tiap tahap
+shard_workers = None  # isi jumlah proses (mis. os.cpu_count()) untuk memproses shard gedung secara paralel
+raster_cache_folder = None  # isi path folder (mis. './cache/raster') agar OHM di-decode sekali dan dibaca via memmap
+stage_cache_folder = None  # isi path folder di luar temp (mis. './cache/stage') agar tahap yang inputnya tidak berubah dilewati
+incremental_update = False  # True: hanya gedung yang outline-nya berubah sejak run sebelumnya yang diproses ulang
+clean_threshold = 0.1  # Batas overlap facet atap yang dibersihkan sebelum union (None = lewati)
+clean_iterations = 1
+sieve_size = None  # Region kelas aspect lebih kecil dari ini (piksel) digabung sebelum poligonisasi (None = min_area, 0 = lewati)
+compact_cityjson = False  # True: vertices dikuantisasi (transform) dan dilas, file ditulis tanpa indentasi
+metrics_file = None  # isi path file (mis. './output/metrics.jsonl') untuk mencatat waktu, CPU, memori dan jumlah item per tahap
+profile_stages = None  # 'cprofile' atau 'pyinstrument' untuk menyimpan profil setiap tahap di samping metrics_file
+show_progress = True  # False untuk batch job tanpa progress bar
 
 # FILE TEMPORARY JANGAN DIUBAH
 temp_folder = './temp'
-output_path = os.path.join(temp_folder, 'output.tif')
-output_shp = os.path.join(temp_folder, 'shp_output.shp')
-output_shapefile_bersihh = os.path.join(temp_folder, 'bersihh.shp')
-output_union_path = os.path.join(temp_folder, 'union.shp')
-sip = os.path.join(temp_folder, './sip.shp')
-output_folder = os.path.join(temp_folder, 'lod2')
-output_lod2 = os.path.join(temp_folder, 'full_building.obj')
-output_solid_lod2 = os.path.join(temp_folder, 'lod2.obj')
-smooth_obj = (temp_folder, 'halus.obj')
 
 
 def create_temp_folder(folder_path):
@@ -43,45 +40,29 @@ def clear_temp_folder(folder_path):
 
 def main():
     create_temp_folder(temp_folder)
+    set_progress(show_progress)
+    metrics = Metrics(metrics_file, profile_stages)
 
     try:
-        start = time.time()
-        process_aspect(ohm_path, building_outline_path, output_path)
-        print(f"Pembuatan Aspect selesai dalam {time.time() - start:.2f} detik")
-
-        start = time.time()
-        process_raster(output_path, output_shp, 4)
-        print(f"Pembuatan shp dari Aspect selesai dalam {time.time() - start:.2f} detik")
-
-        # start = time.time()
-        # runnn(output_shp, output_shapefile_bersihh, 0.1, 1)
-        # print(f"Pembersihan geometry selesai dalam {time.time() - start:.2f} detik")
-
-        start = time.time()
-        # process_union_clip(output_shapefile_bersihh, building_outline_path, output_union_path)
-        process_union_clip(output_shp, building_outline_path, output_union_path)
-        print(f"Perapihan geometry selesai dalam {time.time() - start:.2f} detik")
-
-        start = time.time()
-        # process_union_clip(output_shapefile_bersihh, building_outline_path, output_union_path)
-        process_union_clip(output_shp, building_outline_path, output_union_path)
-        print(f"Perapihan geometry selesai dalam {time.time() - start:.2f} detik")       
-
-        start = time.time()
-        generate_complete_building_model(output_union_path, ohm_path, output_lod2, base_height=0)
-        print(f"Pembuatan model obj LOD 2 selesai dalam {time.time() - start:.2f} detik")
-
-        start = time.time()
-        make_obj_solid(output_lod2, output_solid_lod2, False)
-        print(f"Membuat LOD 2 menjadi solid selesai dalam {time.time() - start:.2f} detik")
-
-        start = time.time()
-        split_obj_by_shapefile(output_solid_lod2, building_outline_path, output_folder)
-        print(f"Pemisahan per ID LOD 2 selesai dalam {time.time() - start:.2f} detik")
-
-        start = time.time()
-        obj_to_cityjson(output_folder, output_cityjson, epsg)
-        print(f"Pembuatan CityJSON selesai dalam {time.time() - start:.2f} detik")
+        if incremental_update:
+            run_incremental(ohm_path, building_outline_path, output_cityjson, epsg,
+                            min_area=4, base_height=0, raster_cache_dir=raster_cache_folder,
+                            workers=shard_workers, clean_threshold=clean_threshold,
+                            clean_iterations=clean_iterations, sieve_size=sieve_size)
+        elif shard_workers:
+            run_sharded_pipeline(ohm_path, building_outline_path, output_cityjson, epsg,
+                                 workers=shard_workers, min_area=4, base_height=0,
+                                 raster_cache_dir=raster_cache_folder, compact=compact_cityjson,
+                                 stage_cache_dir=stage_cache_folder, metrics=metrics,
+                                 clean_threshold=clean_threshold, clean_iterations=clean_iterations,
+                                 sieve_size=sieve_size)
+        else:
+            run_pipeline(ohm_path, building_outline_path, output_cityjson, epsg,
+                         min_area=4, base_height=0, checkpoint_dir=checkpoint_folder,
+                         raster_cache_dir=raster_cache_folder, compact=compact_cityjson,
+                         stage_cache_dir=stage_cache_folder, metrics=metrics,
+                         clean_threshold=clean_threshold, clean_iterations=clean_iterations,
+                         sieve_size=sieve_size)
     
     # except Exception as e:
     #     print(f"salah : {e}")
@@ -0,0 +1,236 @@
+"""
+Benchmark tahap pipeline dengan data sintetis.
+
+Contoh:
+    python benchmark.py --buildings 10 1000 --complexity 3 --baseline benchmark_baseline.json
+    python benchmark.py --buildings 10 1000 --save-baseline benchmark_baseline.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+import geopandas as gpd
+import rasterio
+import shapely
+from rasterio.features import rasterize
+from rasterio.transform import from_origin
+from scipy import ndimage
+from metrics import Metrics, set_progress
+
+EPSG = 32749
+ORIGIN = (690000.0, 9200000.0)  # Pojok kiri atas area sintetis (UTM 49S)
+
+
+def synthetic_outlines(n_buildings, seed=0, spacing=30.0, min_size=8.0, max_size=20.0):
+    """
+    Outline gedung persegi panjang acak pada grid, dengan kolom id 1..n.
+
+    Setiap gedung berada di sel grid berukuran spacing sehingga tidak ada yang
+    saling tumpang tindih dan luas raster naik linear dengan jumlah gedung.
+    """
+    rng = np.random.default_rng(seed)
+    columns = int(np.ceil(np.sqrt(n_buildings)))
+    cell = np.arange(n_buildings)
+    width = rng.uniform(min_size, max_size, n_buildings)
+    depth = rng.uniform(min_size, max_size, n_buildings)
+    x0 = ORIGIN[0] + (cell % columns) * spacing + rng.uniform(1, spacing - width - 1)
+    y0 = ORIGIN[1] - (cell // columns + 1) * spacing + rng.uniform(1, spacing - depth - 1)
+    geometries = shapely.box(x0, y0, x0 + width, y0 + depth)
+    return gpd.GeoDataFrame({'id': cell + 1}, geometry=geometries, crs=f"EPSG:{EPSG}")
+
+
+def roof_parts(outlines, complexity=1):
+    """Bagi setiap gedung menjadi `complexity` bagian sepanjang sisi terpanjangnya (satu atap perisai per bagian)."""
+    bounds = shapely.bounds(outlines.geometry.values)
+    k = np.arange(complexity)
+    minx, miny, maxx, maxy = (np.repeat(bounds[:, i], complexity) for i in range(4))
+    along_x = (maxx - minx) >= (maxy - miny)
+    step = np.where(along_x, maxx - minx, maxy - miny) / complexity
+    offset = np.tile(k, len(outlines)) * step
+    part_minx = np.where(along_x, minx + offset, minx)
+    part_maxx = np.where(along_x, minx + offset + step, maxx)
+    part_miny = np.where(along_x, miny, miny + offset)
+    part_maxy = np.where(along_x, maxy, miny + offset + step)
+    return shapely.box(part_minx, part_miny, part_maxx, part_maxy)
+
+
+def synthetic_ohm(outlines, output_path, resolution=0.5, complexity=1, eave_height=6.0, slope=0.6, seed=0):
+    """
+    Tulis OHM GeoTIFF sintetis: tanah 0 dan atap perisai di setiap bagian gedung.
+
+    Tinggi atap = tinggi lisplang + slope * jarak ke tepi bagian, sehingga setiap
+    bagian menghasilkan empat facet dengan arah aspect berbeda dan jumlah facet
+    per gedung naik dengan complexity.
+    """
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = outlines.total_bounds
+    margin = 5 * resolution
+    width = int(np.ceil((maxx - minx + 2 * margin) / resolution))
+    height = int(np.ceil((maxy - miny + 2 * margin) / resolution))
+    transform = from_origin(minx - margin, maxy + margin, resolution, resolution)
+
+    parts = roof_parts(outlines, complexity)
+    labels = rasterize(zip(parts, range(1, len(parts) + 1)), out_shape=(height, width),
+                       transform=transform, fill=0, dtype=np.int32)
+    # Piksel yang bertetangga dengan label lain menjadi tepi (jarak 0)
+    edge = ((labels != ndimage.grey_erosion(labels, size=3)) |
+            (labels != ndimage.grey_dilation(labels, size=3)))
+    distance = ndimage.distance_transform_edt((labels > 0) & ~edge) * resolution
+    eave = np.concatenate(([0.0], rng.uniform(0.8, 1.2, len(parts)) * eave_height))
+    ohm = np.where(labels > 0, eave[labels] + slope * distance, 0).astype(np.float32)
+
+    profile = dict(driver='GTiff', width=width, height=height, count=1, dtype='float32',
+                   crs=f"EPSG:{EPSG}", transform=transform, nodata=-9999,
+                   tiled=True, blockxsize=256, blockysize=256, compress='deflate')
+    with rasterio.open(output_path, 'w', **profile) as dst:
+        dst.write(ohm, 1)
+    return width * height
+
+
+def stage_commands(paths, min_area=4, clean_threshold=0.1, clean_iterations=1):
+    """
+    Tahap pipeline berbasis file sesuai urutan di __main__, masing-masing (nama, modul, fungsi, argumen).
+
+    Seperti __main__, facet atap dibersihkan (cleann.runnn) sebelum union
+    kecuali clean_threshold None.
+    """
+    roof = paths["roof"] if clean_threshold is None else paths["clean"]
+    return [
+        ("process_aspect", "file1", "process_aspect",
+         (paths["ohm"], paths["outline"], paths["aspect"])),
+        ("process_raster", "file2_new", "process_raster",
+         (paths["aspect"], paths["roof"], min_area)),
+    ] + ([] if clean_threshold is None else [
+        ("runnn", "cleann", "runnn",
+         (paths["roof"], paths["clean"], clean_threshold, clean_iterations)),
+    ]) + [
+        ("process_union_clip", "file4", "process_union_clip",
+         (roof, paths["outline"], paths["union"])),
+        ("generate_complete_building_model", "full_building", "generate_complete_building_model",
+         (paths["union"], paths["ohm"], paths["model"])),
+        ("make_obj_solid", "make_solid", "make_obj_solid",
+         (paths["model"], paths["solid"], False)),
+        ("split_obj_by_shapefile", "separate_obj", "split_obj_by_shapefile",
+         (paths["solid"], paths["outline"], paths["parts"])),
+        ("obj_to_cityjson", "tocityjson", "obj_to_cityjson",
+         (paths["parts"], paths["cityjson"], EPSG)),
+    ]
+
+
+def run_stage(module_name, function_name, args):
+    """
+    Worker: jalankan satu tahap dan ukur waktu, CPU dan memori puncak (metrics.Metrics).
+
+    Dijalankan di proses baru untuk setiap tahap, sehingga memori puncak tidak
+    tercampur dengan tahap sebelumnya. Progress bar dimatikan agar tidak ikut
+    terukur.
+    """
+    import importlib
+    function = getattr(importlib.import_module(module_name), function_name)
+    set_progress(False)
+    metrics = Metrics(verbose=False)
+    with metrics.stage(function_name) as record:
+        function(*args)
+    return {key: record[key] for key in ("wall_s", "cpu_s", "peak_rss_mb", "rss_growth_mb")}
+
+
+def run_benchmark(n_buildings, workdir, complexity=1, resolution=0.5, min_area=4, seed=0):
+    """Buat data sintetis untuk n_buildings lalu jalankan dan ukur setiap tahap secara terpisah."""
+    case_dir = os.path.join(workdir, f"n{n_buildings}_c{complexity}")
+    os.makedirs(os.path.join(case_dir, "parts"), exist_ok=True)
+    paths = {name: os.path.join(case_dir, filename) for name, filename in [
+        ("outline", "outline.shp"), ("ohm", "ohm.tif"), ("aspect", "aspect.tif"),
+        ("roof", "roof.shp"), ("clean", "bersihh.geojson"), ("union", "union.shp"),
+        ("model", "full_building.obj"), ("solid", "lod2.obj"), ("parts", "parts"), ("cityjson", "city.json")]}
+
+    outlines = synthetic_outlines(n_buildings, seed)
+    outlines.to_file(paths["outline"])
+    pixels = synthetic_ohm(outlines, paths["ohm"], resolution, complexity, seed=seed)
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name, module_name, function_name, args in stage_commands(paths, min_area):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_stage, module_name, function_name, args).result()
+        result["buildings_per_s"] = n_buildings / result["wall_s"] if result["wall_s"] else None
+        results[name] = result
+        print(f"[{n_buildings} gedung] {name}: {result['wall_s']:.2f} detik, "
+              f"{result['buildings_per_s']:.1f} gedung/detik, puncak {result['peak_rss_mb']:.1f} MB "
+              f"(naik {result['rss_growth_mb']:.1f} MB)")
+    return {"buildings": n_buildings, "complexity": complexity, "pixels": pixels, "stages": results}
+
+
+def case_name(case):
+    return f"n{case['buildings']}_c{case['complexity']}"
+
+
+def compare_to_baseline(cases, baseline, threshold=1.2):
+    """
+    Bandingkan waktu dan memori dengan baseline; rasio > threshold ditandai regresi.
+
+    Mengembalikan list (kasus, tahap, metrik, rasio) untuk semua regresi.
+    """
+    baseline_cases = {case_name(case): case for case in baseline["cases"]}
+    regressions = []
+    for case in cases:
+        reference = baseline_cases.get(case_name(case))
+        if reference is None:
+            continue
+        for stage, result in case["stages"].items():
+            reference_stage = reference["stages"].get(stage)
+            if reference_stage is None:
+                continue
+            # Baseline lama tanpa rss_growth_mb menyimpan kenaikan RSS sebagai peak_rss_mb
+            legacy = "rss_growth_mb" not in reference_stage
+            for metric in ("wall_s", "peak_rss_mb", "rss_growth_mb"):
+                reference_metric = "peak_rss_mb" if legacy and metric == "rss_growth_mb" else metric
+                if legacy and metric == "peak_rss_mb":
+                    continue
+                # Nilai sangat kecil (di bawah 50 ms / 1 MB) terlalu bising untuk dibandingkan
+                floor = 0.05 if metric == "wall_s" else 1.0
+                ratio = max(result[metric], floor) / max(reference_stage[reference_metric], floor)
+                result[f"{metric}_ratio"] = ratio
+                if ratio > threshold:
+                    regressions.append((case_name(case), stage, metric, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tahap pipeline LOD2 dengan data sintetis")
+    parser.add_argument("--buildings", type=int, nargs="+", default=[10, 100, 1000],
+                        help="jumlah gedung per kasus (mis. 10 1000 100000)")
+    parser.add_argument("--complexity", type=int, default=1, help="jumlah bagian atap perisai per gedung")
+    parser.add_argument("--resolution", type=float, default=0.5, help="ukuran piksel OHM sintetis (meter)")
+    parser.add_argument("--workdir", default="./temp/benchmark")
+    parser.add_argument("--output", default=None, help="simpan hasil benchmark ke file JSON ini")
+    parser.add_argument("--baseline", default=None, help="file JSON baseline untuk perbandingan")
+    parser.add_argument("--save-baseline", default=None, help="simpan hasil sebagai baseline baru")
+    parser.add_argument("--threshold", type=float, default=1.2, help="rasio terhadap baseline yang dianggap regresi")
+    args = parser.parse_args()
+
+    cases = [run_benchmark(n, args.workdir, args.complexity, args.resolution) for n in args.buildings]
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "cpu_count": os.cpu_count(), "cases": cases}
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(cases, json.load(f), args.threshold)
+        for case, stage, metric, ratio in regressions:
+            print(f"REGRESI {case} {stage} {metric}: {ratio:.2f}x baseline")
+        if not regressions:
+            print("Tidak ada regresi terhadap baseline")
+        exit_code = 1 if regressions else 0
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Hasil benchmark disimpan ke {path}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
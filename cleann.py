@@ -1,84 +1,73 @@
 import geopandas as gpd
 from tqdm import tqdm
-from shapely.ops import unary_union
+from metrics import progress_options
 import numpy as np
+import shapely
 
 
-def runnn(input:str, output:str, thres:float, iter:float):
-    # Read GeoJSON file into GeoDataFrame with error handling
-    THRESHOLD = thres
-    ITER = iter
-
-    for iteration in range(ITER):
-        try:
-            if iteration == 0:
-                building_gdf = gpd.read_file(input)
-            else:
-                building_gdf = gpd.read_file(output)
-
-            # Fix invalid geometries
-            building_gdf['geometry'] = building_gdf['geometry'].buffer(0)
+def clean_overlaps(building_gdf, threshold, iterations=1):
+    """
+    Kurangi setiap fitur dengan fitur sesudahnya yang overlap-nya signifikan (di memori).
 
-            # Create a spatial index for faster intersection checks
-            building_gdf = building_gdf.dropna(subset=['geometry'])  # Drop rows with invalid geometries
-            if not building_gdf.empty:
-                spatial_index = building_gdf.sindex
-            else:
-                print("GeoDataFrame is empty after dropping rows with invalid geometries.")
-                continue  # Skip to the next iteration if GeoDataFrame is empty
+    Pasangan kandidat diambil dari satu sindex.query untuk semua fitur, luas
+    irisan dihitung sekali per pasangan secara vektor, lalu fitur i dikurangi
+    setiap fitur j > i yang irisannya lebih dari threshold terhadap luas i atau
+    j. Semua keputusan memakai geometri awal iterasi, sama seperti runnn versi
+    lama. Kolom atribut dipertahankan; kolom 'merged' menandai fitur yang
+    dikurangi.
+    """
+    for _ in tqdm(range(iterations), desc="Cleaning overlaps", unit="iteration", **progress_options()):
+        # Perbaiki geometri tidak valid dan buang yang kosong (None)
+        building_gdf = building_gdf.copy()
+        building_gdf['geometry'] = building_gdf.geometry.buffer(0)
+        building_gdf = building_gdf.dropna(subset=['geometry']).reset_index(drop=True)
+        if building_gdf.empty:
+            print("GeoDataFrame is empty after dropping rows with invalid geometries.")
+            return building_gdf
 
-        except ValueError as e:
-            print(f"Error reading GeoJSON file: {e}")
-            # continue  # Skip to the next iteration if there's an error reading the GeoJSON file
+        geometries = building_gdf.geometry.values
+        left, right = building_gdf.sindex.query(geometries, predicate='intersects')
+        pairs = left < right
+        left, right = left[pairs], right[pairs]
 
-        # List to store merged features
-        merged_features = []
+        # Luas irisan tiap pasangan relatif terhadap luas masing-masing fitur
+        area = shapely.area(geometries)
+        intersection_area = shapely.area(shapely.intersection(geometries[left], geometries[right]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            overlap = ((intersection_area / area[left] > threshold) |
+                       (intersection_area / area[right] > threshold))
+        left, right = left[overlap], right[overlap]
 
-        # Set to keep track of processed features
-        processed_features = set()
+        # Kurangi per putaran: putaran ke-k memproses kandidat ke-k dari setiap fitur
+        order = np.lexsort((right, left))
+        left, right = left[order], right[order]
+        rank = np.arange(len(left)) - np.searchsorted(left, left)
+        result = geometries.copy()
+        for k in range(rank.max() + 1 if len(rank) else 0):
+            step = rank == k
+            result[left[step]] = shapely.difference(result[left[step]], geometries[right[step]])
 
-        # Iterate over each feature
-        for i, geom_a in tqdm(building_gdf.iterrows(), total=len(building_gdf), desc="Processing features"):            
-            # Get potential intersecting features using spatial index
-            if spatial_index:
-                possible_matches_index = list(spatial_index.intersection(geom_a['geometry'].bounds))
-            else:
-                possible_matches_index = []
+        merged = np.zeros(len(building_gdf), dtype=bool)
+        merged[left] = True
+        building_gdf['geometry'] = result
+        building_gdf['merged'] = merged
+    return building_gdf
 
-            # List to store geometries of intersecting features
-            intersecting_geometries = []
 
-            # Check intersection with other features
-            for j in possible_matches_index:
-                if i != j and i < j:
-                    geom_b = building_gdf.loc[j, 'geometry']
-
-                    # Check if the features intersect
-                    if geom_a['geometry'].intersects(geom_b):
-                        # Calculate the intersection area relative to each feature's area
-                        intersection_area_a = geom_a['geometry'].intersection(geom_b).area / geom_a['geometry'].area
-                        intersection_area_b = geom_a['geometry'].intersection(geom_b).area / geom_b.area
-
-                        # Check if either feature has an intersection area greater than threshold value
-                        if intersection_area_a > THRESHOLD or intersection_area_b > THRESHOLD:
-                            intersecting_geometries.append(geom_b) 
-                            processed_features.add(j)  # Mark as processed
+def runnn(input:str, output:str, thres:float, iter:float):
+    """Versi berbasis file dari clean_overlaps: baca input, bersihkan di memori, tulis GeoJSON sekali."""
+    try:
+        building_gdf = gpd.read_file(input)
+    except ValueError as e:
+        print(f"Error reading GeoJSON file: {e}")
+        return
 
-            
-            # Merge intersecting features
-            if intersecting_geometries:
-                # Apply the difference function to the intersecting geometries
-                for intersecting_geometry in intersecting_geometries:
-                    geom_a['geometry'] = geom_a['geometry'].difference(intersecting_geometry)
-                
-                # Store the updated geometry
-                merged_features.append({'id': f"{i}_merged", 'geometry': geom_a['geometry']})
-            else:
-                # If no intersection found, add the original feature
-                merged_features.append({'id': f"{i}_asli", 'geometry': geom_a['geometry']})
-            
-        # Create a GeoDataFrame with the merged features
-        merged_features_gdf = gpd.GeoDataFrame(merged_features, crs=building_gdf.crs)
+    building_gdf = clean_overlaps(building_gdf, thres, int(iter))
+    if building_gdf.empty:
+        return
 
-        # Save the updated GeoDataFrame to a new GeoJSON file
-        merged_features_gdf.to_file(output, driver='GeoJSON')
\ No newline at end of file
+    # Format output sama seperti sebelumnya: id "<i>_merged" atau "<i>_asli" dan geometry
+    suffix = np.where(building_gdf['merged'], "_merged", "_asli")
+    ids = [f"{i}{s}" for i, s in zip(building_gdf.index, suffix)]
+    merged_features_gdf = gpd.GeoDataFrame({'id': ids}, geometry=building_gdf.geometry.values, crs=building_gdf.crs)
+    merged_features_gdf.to_file(output, driver='GeoJSON')
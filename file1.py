@@ -1,31 +1,47 @@
 from tqdm import tqdm
+from metrics import progress_options
 import rasterio
-from rasterio.enums import Resampling
 from rasterio.features import geometry_mask
+from rasterio.windows import Window, bounds as window_bounds
+from shapely.geometry import box
 import numpy as np
 import geopandas as gpd
+from tiling import run_tiled_array, run_tiled_file, pixel_window
+from raster_cache import open_raster
+from file2_new import classify_aspect
 
-def process_aspect(ohm_path, building_outline_path, output_path):
-    # Fungsi untuk menghitung aspect dengan rentang 0 hingga 360
-    def calculate_aspect(dem):
-        dx, dy = np.gradient(dem)
-        aspect = np.arctan2(dy, -dx) * (180 / np.pi)  # Pembalikan dx dan dy
-        aspect = (aspect + 360) % 360  # Memastikan rentang 0 hingga 360
-        return aspect
+# Fungsi untuk menghitung aspect dengan rentang 0 hingga 360
+def calculate_aspect(dem):
+    dx, dy = np.gradient(dem)
+    aspect = np.arctan2(dy, -dx) * (180 / np.pi)  # Pembalikan dx dan dy
+    aspect = (aspect + 360) % 360  # Memastikan rentang 0 hingga 360
+    return aspect
+
+def run_full_raster(kernel, src, ohm_path, dtype, workers=None, cache_dir=None):
+    """Jalankan kernel pada seluruh raster: serial, per tile dari memmap cache, atau per tile dari file."""
+    if workers == 1:
+        return kernel(src.read(1))
+    if cache_dir is not None:
+        return run_tiled_array(kernel, src.read(1), dtype, workers=workers)
+    return run_tiled_file(kernel, ohm_path, dtype, workers=workers)
+
+def process_aspect(ohm_path, building_outline_path, output_path, windowed=False, workers=None, cache_dir=None):
+    # workers=None memakai semua core, workers=1 menjalankan versi serial
+    # cache_dir: folder cache memmap OHM (lihat raster_cache), None = baca langsung dari GeoTIFF
+    if windowed:
+        return process_aspect_windowed(ohm_path, building_outline_path, output_path, cache_dir=cache_dir)
 
     # Mulai progres bar
     total_steps = 5  # Jumlah tahapan utama dalam proses
-    with tqdm(total=total_steps, desc="Processing Aspect", unit="step") as pbar:
-        
-        # Baca file OHM
-        with rasterio.open(ohm_path) as src:
-            ohm_data = src.read(1, resampling=Resampling.bilinear)
+    with tqdm(total=total_steps, desc="Processing Aspect", unit="step", **progress_options()) as pbar:
+
+        # Baca file OHM dan hitung aspect (per tile dengan halo 1 piksel jika paralel)
+        with open_raster(ohm_path, cache_dir) as src:
             profile = src.profile
             transform = src.transform
-        pbar.update(1)  # Update progres bar
+            pbar.update(1)  # Update progres bar
 
-        # Hitung aspect dari data OHM
-        aspect_data = calculate_aspect(ohm_data)
+            aspect_data = run_full_raster(calculate_aspect, src, ohm_path, np.float64, workers, cache_dir)
         pbar.update(1)  # Update progres bar
 
         # Baca outline gedung
@@ -34,8 +50,8 @@ def process_aspect(ohm_path, building_outline_path, output_path):
         pbar.update(1)  # Update progres bar
 
         # Buat mask untuk area outline gedung
-        mask = geometry_mask([geom for geom in building_outline.geometry], 
-                             transform=transform, 
+        mask = geometry_mask([geom for geom in building_outline.geometry],
+                             transform=transform,
                              invert=True,
                              out_shape=aspect_data.shape)
         pbar.update(1)  # Update progres bar
@@ -47,3 +63,117 @@ def process_aspect(ohm_path, building_outline_path, output_path):
         with rasterio.open(output_path, 'w', **profile) as dst:
             dst.write(aspect_clipped, 1)
         pbar.update(1)  # Update progres bar terakhir
+
+def building_blocks(src, building_outline, kernel, halo=1):
+    """
+    Jalankan kernel pada window di sekitar bounding box tiap gedung.
+
+    Setiap window dibaca dengan halo `halo` piksel agar gradient di tepi window
+    sama persis dengan perhitungan satu raster penuh, lalu halo dibuang.
+    Menghasilkan (window_inti, hasil_kernel, mask_gedung) per gedung; mask memakai
+    semua outline yang menyentuh window, sehingga window yang saling tumpang
+    tindih memberi nilai yang sama untuk piksel yang sama.
+    """
+    building_outline = building_outline[building_outline.geometry.notnull() & ~building_outline.geometry.is_empty]
+    geometries = building_outline.geometry.values
+    sindex = building_outline.sindex
+
+    for geom in geometries:
+        core = pixel_window(geom.bounds, src.transform, src.height, src.width)
+        if core.width == 0 or core.height == 0:
+            continue  # Gedung di luar domain raster
+        read_window = pixel_window(geom.bounds, src.transform, src.height, src.width, halo=halo)
+
+        result = kernel(src.read(1, window=read_window))
+        row = core.row_off - read_window.row_off
+        col = core.col_off - read_window.col_off
+        result = result[row:row + core.height, col:col + core.width]
+
+        core_box = box(*window_bounds(core, src.transform))
+        neighbours = geometries[sindex.query(core_box, predicate='intersects')]
+        mask = geometry_mask(list(neighbours),
+                             transform=src.window_transform(core),
+                             invert=True,
+                             out_shape=result.shape)
+        yield core, result, mask
+
+def process_aspect_windowed(ohm_path, building_outline_path, output_path, halo=1, block_size=256, cache_dir=None):
+    """
+    Hitung aspect hanya pada window di sekitar bounding box tiap gedung.
+
+    Hasil ditulis ke GeoTIFF tiled dan sparse, sehingga blok di luar gedung tidak
+    pernah dialokasikan dan memori sebanding dengan luas gedung, bukan luas raster.
+    """
+    building_outline = gpd.read_file(building_outline_path)
+
+    with open_raster(ohm_path, cache_dir) as src:
+        building_outline = building_outline.to_crs(src.crs)
+
+        profile = src.profile
+        profile.update(dtype=rasterio.float32, count=1, nodata=np.nan,
+                       tiled=True, blockxsize=block_size, blockysize=block_size, sparse_ok=True)
+
+        with rasterio.open(output_path, 'w', **profile) as dst:
+            blocks = building_blocks(src, building_outline, calculate_aspect, halo)
+            for core, aspect_core, mask in tqdm(blocks, total=len(building_outline),
+                                                desc="Processing Aspect (windowed)", unit="building", **progress_options()):
+                dst.write(np.where(mask, aspect_core, np.nan).astype(np.float32), 1, window=core)
+
+def aspect_class_kernel(dem):
+    """OHM -> kelas aspect uint8 untuk satu blok, tanpa menyimpan aspect float."""
+    return classify_aspect(calculate_aspect(dem))
+
+def process_aspect_classes(ohm_path, building_outline_path, debug_path=None, windowed=False, workers=None, cache_dir=None):
+    """
+    Tahap gabungan aspect + klasifikasi: OHM langsung menjadi raster kelas uint8.
+
+    Menggantikan process_aspect + classify_aspect tanpa menulis dan membaca ulang
+    GeoTIFF aspect float32. Mengembalikan (raster_kelas, profile). Jika debug_path
+    diisi, raster kelas juga disimpan ke disk.
+    """
+    building_outline = gpd.read_file(building_outline_path)
+    return compute_aspect_classes(ohm_path, building_outline, debug_path, windowed, workers, cache_dir=cache_dir)
+
+def compute_aspect_classes(ohm_path, building_outline, debug_path=None, windowed=False, workers=None,
+                           crop=False, cache_dir=None):
+    """
+    process_aspect_classes dengan outline gedung berupa GeoDataFrame di memori.
+
+    Dengan windowed=True dan crop=True, raster kelas hanya mencakup bounding box
+    gabungan outline (profile ikut disesuaikan), cocok untuk satu shard gedung.
+    """
+    with tqdm(total=3, desc="Processing Aspect Classes", unit="step", **progress_options()) as pbar:
+        with open_raster(ohm_path, cache_dir) as src:
+            building_outline = building_outline.to_crs(src.crs)
+            profile = src.profile
+            profile.update(dtype=rasterio.uint8, count=1, nodata=0)
+            pbar.update(1)
+
+            if windowed:
+                # Hanya window gedung yang dihitung, sisanya tetap kelas 0
+                if crop:
+                    extent = pixel_window(building_outline.total_bounds, src.transform, src.height, src.width)
+                else:
+                    extent = Window(0, 0, src.width, src.height)
+                profile.update(width=extent.width, height=extent.height,
+                               transform=src.window_transform(extent))
+                classified = np.zeros((extent.height, extent.width), dtype=np.uint8)
+                for core, classes_core, mask in building_blocks(src, building_outline, aspect_class_kernel):
+                    rows = slice(core.row_off - extent.row_off, core.row_off - extent.row_off + core.height)
+                    cols = slice(core.col_off - extent.col_off, core.col_off - extent.col_off + core.width)
+                    classified[rows, cols][mask] = classes_core[mask]
+            else:
+                classified = run_full_raster(aspect_class_kernel, src, ohm_path, np.uint8, workers, cache_dir)
+                mask = geometry_mask([geom for geom in building_outline.geometry],
+                                     transform=src.transform,
+                                     invert=True,
+                                     out_shape=classified.shape)
+                classified[~mask] = 0
+            pbar.update(1)
+
+        if debug_path:
+            with rasterio.open(debug_path, 'w', **profile) as dst:
+                dst.write(classified, 1)
+        pbar.update(1)
+
+    return classified, profile
@@ -1,11 +1,11 @@
 from tqdm import tqdm
+from metrics import progress_options
 import rasterio
 import numpy as np
 from rasterio.features import shapes
-from shapely.geometry import shape, LineString
-from shapely.ops import snap
+from shapely.geometry import shape
 import geopandas as gpd
-import pandas as pd
+from file2_new import snap_to_intersections, create_midlines, midline_path, write_midlines
 
 def classify_aspect(data_raster):
     classified_raster = np.zeros_like(data_raster)
@@ -27,35 +27,8 @@ def raster_to_polygons(classified_raster, transform):
 
     return polygons, values
 
-def find_intersection_points(geom1, geom2):
-    intersection = geom1.boundary.intersection(geom2.boundary)
-    if intersection.is_empty:
-        return []
-    elif intersection.geom_type == 'Point':
-        return [intersection]
-    elif intersection.geom_type == 'MultiPoint':
-        return list(intersection.geoms)
-    return []
-
-def snap_to_intersections(gdf, tol):
-    geometries = gdf.geometry.values
-    for i, geom1 in enumerate(geometries):
-        for geom2 in geometries[i + 1:]:
-            intersection_points = find_intersection_points(geom1, geom2)
-            for pt in intersection_points:
-                geom1 = snap(geom1, pt, tol)
-                geom2 = snap(geom2, pt, tol)
-    return geometries
-
-def create_midline_between_geoms(geom1, geom2):
-    overlap = geom1.intersection(geom2)
-    if overlap.is_empty or overlap.geom_type not in ['Polygon', 'MultiPolygon']:
-        return None
-    midline = LineString(overlap.centroid.coords)
-    return midline
-
 def process_raster(input_aspect, output_shp):
-    with tqdm(total=5, desc="Processing Raster", unit="step") as pbar:
+    with tqdm(total=5, desc="Processing Raster", unit="step", **progress_options()) as pbar:
         
         with rasterio.open(input_aspect) as src:
             data_raster = src.read(1)
@@ -77,20 +50,13 @@ def process_raster(input_aspect, output_shp):
             gdf['geometry'] = snap_to_intersections(gdf, tolerance)
             pbar.update(1)  # Update setelah snapping intersection
 
-            # Buat midline di antara geometri yang saling overlap
-            midlines = []
-            for i, geom1 in enumerate(gdf.geometry):
-                for geom2 in gdf.geometry[i + 1:]:
-                    midline = create_midline_between_geoms(geom1, geom2)
-                    if midline:
-                        midlines.append(midline)
+            # Buat midline di antara geometri yang saling overlap (layer titik terpisah)
+            write_midlines(create_midlines(gdf), midline_path(output_shp))
             pbar.update(1)  # Update setelah pembuatan midline
 
             # Convex hull untuk setiap geometri dan simpan hasil
             gdf['geometry'] = gdf['geometry'].apply(lambda geom: geom.convex_hull)
-            midline_gdf = gpd.GeoDataFrame(geometry=midlines, crs=gdf.crs)
-            result_gdf = gpd.GeoDataFrame(pd.concat([gdf, midline_gdf], ignore_index=True), crs=gdf.crs)
-            result_gdf.to_file(output_shp, driver='ESRI Shapefile')
+            gdf.to_file(output_shp, driver='ESRI Shapefile')
             pbar.update(1)  # Update setelah penyimpanan hasil
 
     print("Proses raster selesai, hasil disimpan sebagai shapefile!")
@@ -1,9 +1,10 @@
 from tqdm import tqdm
+from metrics import progress_options
 import geopandas as gpd
 
 def filter_shapefile_by_area(input_raw_path, output_new_path, min_area):
     
-    with tqdm(total=3, desc="Filtering Shapefile by Area", unit="step") as pbar:
+    with tqdm(total=3, desc="Filtering Shapefile by Area", unit="step", **progress_options()) as pbar:
         
         # Langkah 1: Membaca shapefile
         gdf = gpd.read_file(input_raw_path)
@@ -1,19 +1,56 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
 from tqdm import tqdm
+from metrics import progress_options
 import rasterio
 import numpy as np
-from rasterio.features import shapes
-from shapely.geometry import shape, LineString
-from shapely.ops import snap
+import shapely
+from rasterio.features import geometry_mask, shapes, sieve
+from rasterio.windows import transform as window_transform
+from shapely.geometry import shape
 import geopandas as gpd
 import pandas as pd
+from scipy import ndimage
+from tiling import pixel_window
+
+# Kelas aspect per sektor 45 derajat: indeks = floor(aspect / 45) bernilai 0..8
+# (360 -> 8), indeks 9 dipakai untuk NaN / nilai di luar 0-360 (kelas 0)
+ASPECT_CLASS_LUT = np.array([1, 2, 2, 3, 3, 4, 4, 1, 1, 0], dtype=np.uint8)
 
 def classify_aspect(data_raster):
-    classified_raster = np.zeros_like(data_raster)
-    classified_raster = np.where(((data_raster >= 315) & (data_raster <= 360)) | ((data_raster >= 0) & (data_raster < 45)), 1, classified_raster)
-    classified_raster = np.where((data_raster >= 45) & (data_raster < 135), 2, classified_raster)
-    classified_raster = np.where((data_raster >= 135) & (data_raster < 225), 3, classified_raster)
-    classified_raster = np.where((data_raster >= 225) & (data_raster < 315), 4, classified_raster)
-    return classified_raster
+    """Klasifikasi aspect ke kelas 1-4 (uint8) dengan satu lookup pada sudut yang dikuantisasi."""
+    index = np.floor_divide(data_raster, 45)
+    index[~((data_raster >= 0) & (data_raster <= 360))] = 9
+    return ASPECT_CLASS_LUT[index.astype(np.intp)]
+
+def sieve_pixels(min_area, transform):
+    """Ukuran sieve default: min_area dalam jumlah piksel."""
+    return int(min_area / abs(transform.a * transform.e))
+
+def clean_classes(classified_raster, sieve_size, majority_size=3):
+    """
+    Bersihkan raster kelas sebelum poligonisasi: filter mayoritas lalu sieve.
+
+    Filter mayoritas mengganti kelas setiap piksel atap dengan kelas 1-4 yang
+    paling banyak di jendela majority_size x majority_size (kelas asal menang
+    jika seri). Sieve menggabungkan region terhubung (4-konektivitas) yang
+    lebih kecil dari sieve_size piksel ke region tetangga terbesar. Piksel
+    kelas 0 (di luar gedung) tidak diubah dan tidak menjadi tujuan
+    penggabungan. sieve_size 0 mematikan pembersihan.
+    """
+    if not sieve_size:
+        return classified_raster
+    roof = classified_raster != 0
+    if majority_size > 1:
+        kernel = np.ones((majority_size, majority_size), dtype=np.uint16)
+        counts = np.stack([ndimage.convolve((classified_raster == value).astype(np.uint16), kernel, mode='constant')
+                           for value in range(1, 5)])
+        current = np.take_along_axis(counts, np.maximum(classified_raster.astype(np.intp) - 1, 0)[None], 0)[0]
+        majority = (counts.argmax(axis=0) + 1).astype(classified_raster.dtype)
+        classified_raster = np.where(roof & (counts.max(axis=0) > current), majority, classified_raster)
+    return sieve(classified_raster, sieve_size, connectivity=4, mask=roof)
 
 def raster_to_polygons(classified_raster, transform):
     mask = classified_raster != 0
@@ -27,72 +64,283 @@ def raster_to_polygons(classified_raster, transform):
 
     return polygons, values
 
-def find_intersection_points(geom1, geom2):
-    intersection = geom1.boundary.intersection(geom2.boundary)
-    if intersection.is_empty:
-        return []
-    elif intersection.geom_type == 'Point':
-        return [intersection]
-    elif intersection.geom_type == 'MultiPoint':
-        return list(intersection.geoms)
-    return []
-
-def snap_to_intersections(gdf, tol):
-    geometries = gdf.geometry.values
-    for i, geom1 in enumerate(geometries):
-        for geom2 in geometries[i + 1:]:
-            intersection_points = find_intersection_points(geom1, geom2)
-            for pt in intersection_points:
-                geom1 = snap(geom1, pt, tol)
-                geom2 = snap(geom2, pt, tol)
-    return geometries
-
-def create_midline_between_geoms(geom1, geom2):
-    overlap = geom1.intersection(geom2)
-    if overlap.is_empty or overlap.geom_type not in ['Polygon', 'MultiPolygon']:
-        return None
-    midline = LineString(overlap.centroid.coords)
-    return midline
-
-def process_raster(input_aspect, output_shp, min_area):
-    with tqdm(total=6, desc="Processing Raster", unit="step") as pbar:
+def building_windows(classified_raster, transform, building_outline):
+    """
+    Potong raster kelas per gedung: (posisi baris outline, blok kelas, mask outline, transform window).
+
+    Window menutupi bounding box outline; mask hanya memuat piksel di dalam
+    outline gedung itu sendiri, sehingga setiap facet berasal dari tepat satu
+    gedung. Gedung di luar raster dilewati. Posisi baris dipakai sebagai tag
+    (bukan id) karena id bisa kosong (NaN) atau ganda.
+    """
+    height, width = classified_raster.shape
+    for position, geom in enumerate(building_outline.geometry.values):
+        if geom is None or geom.is_empty:
+            continue
+        window = pixel_window(geom.bounds, transform, height, width)
+        if window.width == 0 or window.height == 0:
+            continue
+        block = classified_raster[window.toslices()]
+        block_transform = window_transform(window, transform)
+        mask = geometry_mask([geom], transform=block_transform, invert=True, out_shape=block.shape)
+        yield position, block, mask, block_transform
+
+def polygonize_building(task):
+    """Worker: bersihkan lalu poligonisasi satu window gedung, dengan posisi gedung di setiap facet."""
+    position, block, mask, block_transform, sieve_size = task
+    block = clean_classes(np.where(mask, block, 0).astype(block.dtype), sieve_size)
+    polygons, values = raster_to_polygons(block, block_transform)
+    return position, polygons, values
+
+def polygonize_buildings(tasks):
+    """Worker: polygonize_building untuk satu batch window gedung."""
+    return [polygonize_building(task) for task in tasks]
+
+def bounded_map(pool, tasks, batch, window):
+    """
+    Seperti pool.map(polygonize_building, tasks) dengan urutan tetap, tetapi paling banyak
+    window batch (masing-masing batch window gedung) yang sudah dikirim dan belum diambil.
+
+    Window gedung berisi salinan blok raster, jadi batas ini menjaga memori
+    antrean tetap kecil berapa pun jumlah gedungnya.
+    """
+    pending = deque()
+    for task_batch in iter(lambda: list(islice(tasks, batch)), []):
+        if len(pending) == window:
+            yield from pending.popleft().result()
+        pending.append(pool.submit(polygonize_buildings, task_batch))
+    while pending:
+        yield from pending.popleft().result()
+
+def iter_building_polygons(classified_raster, transform, crs, building_outline, min_area=0,
+                           workers=1, chunk_size=1024, sieve_size=0):
+    """
+    Poligonisasi raster kelas per window gedung dan hasilkan GeoDataFrame per chunk.
+
+    Setiap facet diberi kolom 'building' berisi posisi baris outline asalnya
+    di building_outline (file4.union_clip memetakannya kembali ke outline). Window
+    diproses di ProcessPoolExecutor (workers=None memakai semua core, workers=1
+    serial) dengan urutan tetap dan antrean terbatas (bounded_map), dan hasilnya
+    dikumpulkan menjadi chunk berisi chunk_size gedung yang sudah difilter
+    min_area, sehingga daftar polygon seluruh raster tidak pernah ada di memori
+    sekaligus. Setiap window dibersihkan dengan clean_classes(sieve_size)
+    sebelum dipoligonisasi.
+    """
+    building_outline = building_outline.to_crs(crs)
+    tasks = ((*window, sieve_size)
+             for window in building_windows(classified_raster, transform, building_outline))
+
+    def to_frame(rows):
+        buildings, polygons, values = [], [], []
+        for position, building_polygons, building_values in rows:
+            buildings += [position] * len(building_polygons)
+            polygons += building_polygons
+            values += building_values
+        gdf = gpd.GeoDataFrame({'geometry': polygons, 'class': values, 'building': buildings}, crs=crs)
+        return gdf[gdf.geometry.area >= min_area]
+
+    def chunks(results):
+        rows = []
+        for row in tqdm(results, total=len(building_outline), desc="Polygonizing buildings", unit="building", **progress_options()):
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield to_frame(rows)
+                rows = []
+        if rows:
+            yield to_frame(rows)
+
+    if workers == 1:
+        yield from chunks(map(polygonize_building, tasks))
+    else:
+        workers = workers or os.cpu_count()
+        batch = max(1, min(chunk_size, len(building_outline) // (workers * 16)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from chunks(bounded_map(pool, tasks, batch, 2 * workers))
+
+def candidate_pairs(geometries, groups=None):
+    """
+    Pasangan indeks (i < j) geometri yang bersinggungan, dari STRtree, terurut seperti loop i, j.
+
+    Jika groups diisi (satu nilai per geometri), hanya pasangan dengan nilai
+    groups yang sama yang dikembalikan.
+    """
+    tree = shapely.STRtree(geometries)
+    left, right = tree.query(geometries, predicate='intersects')
+    pair = left < right
+    if groups is not None:
+        groups = np.asarray(groups)
+        pair &= groups[left] == groups[right]
+    left, right = left[pair], right[pair]
+    order = np.lexsort((right, left))
+    return left[order], right[order]
+
+def snap_to_intersections(gdf, tol, by=None):
+    """
+    Snap setiap geometri ke titik potong batasnya dengan geometri lain.
+
+    Pasangan kandidat diambil dari STRtree (hanya pasangan yang bersinggungan),
+    titik potong batas dihitung sekaligus dengan operasi vektor shapely 2, lalu
+    setiap geometri di-snap satu kali ke kumpulan titik potongnya. Jika by
+    diisi nama kolom (mis. 'building'), geometri hanya di-snap ke geometri
+    dengan nilai kolom yang sama.
+    """
+    geometries = np.asarray(gdf.geometry.values, dtype=object)
+    if len(geometries) < 2:
+        return geometries
+
+    # Pasangan kandidat (i < j) dari spatial index
+    left, right = candidate_pairs(geometries, gdf[by].values if by else None)
+
+    # Titik potong batas untuk semua pasangan; hanya Point / MultiPoint yang dipakai
+    boundaries = shapely.boundary(geometries)
+    intersections = shapely.intersection(boundaries[left], boundaries[right])
+    is_point = np.isin(shapely.get_type_id(intersections), [0, 4]) & ~shapely.is_empty(intersections)
+    if not is_point.any():
+        return geometries
+
+    # Kumpulkan titik potong per geometri (tiap pasangan berlaku untuk kedua sisi)
+    owners = np.concatenate([left[is_point], right[is_point]])
+    points, point_index = shapely.get_parts(np.tile(intersections[is_point], 2), return_index=True)
+    point_owner = owners[point_index]
+    order = np.argsort(point_owner, kind='stable')
+    owner_ids, group_index = np.unique(point_owner[order], return_inverse=True)
+    targets = shapely.multipoints(points[order], indices=group_index)
+
+    snapped = geometries.copy()
+    snapped[owner_ids] = shapely.snap(geometries[owner_ids], targets, tol)
+    return snapped
+
+def create_midlines(gdf, by=None):
+    """
+    Buat midline untuk semua pasangan geometri yang overlap sekaligus.
+
+    Irisan dan centroid semua pasangan kandidat dihitung dengan operasi vektor
+    shapely 2; hanya irisan berupa Polygon / MultiPolygon yang menghasilkan
+    midline. Midline adalah Point di centroid area overlap (versi lama membuat
+    LineString satu titik, yang tidak valid), jadi hasilnya layer titik
+    terpisah dan tidak digabung dengan facet polygon. by membatasi pasangan
+    seperti pada snap_to_intersections.
+    """
+    geometries = np.asarray(gdf.geometry.values, dtype=object)
+    left, right = candidate_pairs(geometries, gdf[by].values if by else None)
+    overlaps = shapely.intersection(geometries[left], geometries[right])
+    is_area = np.isin(shapely.get_type_id(overlaps), [3, 6]) & ~shapely.is_empty(overlaps)
+
+    centroids = shapely.get_coordinates(shapely.centroid(overlaps[is_area]))
+    return gpd.GeoDataFrame(geometry=shapely.points(centroids), crs=gdf.crs)
+
+def write_midlines(midline_gdf, path):
+    """Simpan layer titik midline ke shapefile tersendiri (dilewati jika path None atau kosong)."""
+    if path and not midline_gdf.empty:
+        midline_gdf.to_file(path, driver='ESRI Shapefile')
+
+def midline_path(output_shp):
+    """Path layer midline di samping shapefile facet: <nama>_midlines.shp."""
+    root, ext = os.path.splitext(output_shp)
+    return f"{root}_midlines{ext}"
+
+def iter_roof_facets(classified_raster, transform, crs, building_outline, min_area=0, workers=1,
+                     sieve_size=0, midlines_path=None, chunk_size=1024):
+    """
+    Facet atap final (snap dan convex hull) per chunk gedung dari iter_building_polygons.
+
+    Facet hanya di-snap ke (dan dibuat midline dengan) facet dari gedung yang
+    sama (kolom 'building'), sehingga setiap chunk selesai diproses dan
+    diteruskan ke pemanggil begitu dipoligonisasi, tanpa menunggu seluruh
+    raster. Midline semua chunk disimpan ke midlines_path (jika diisi)
+    setelah chunk terakhir.
+    """
+    tolerance = max(abs(transform.a), abs(transform.e))
+    midlines = []
+    for chunk in iter_building_polygons(classified_raster, transform, crs, building_outline, min_area,
+                                        workers=workers, chunk_size=chunk_size, sieve_size=sieve_size):
+        chunk = chunk.reset_index(drop=True)
+        chunk['geometry'] = snap_to_intersections(chunk, tolerance, by='building')
+        if midlines_path:
+            midlines.append(create_midlines(chunk, by='building'))
+        chunk['geometry'] = shapely.convex_hull(chunk.geometry.values)
+        yield chunk
+    if midlines:
+        write_midlines(gpd.GeoDataFrame(pd.concat(midlines, ignore_index=True), crs=crs), midlines_path)
+
+def classes_to_polygons(classified_raster, transform, crs, min_area, pbar=None, building_outline=None,
+                        workers=1, sieve_size=None, midlines_path=None):
+    """
+    Poligonisasi raster kelas aspect, lalu filter, snap, midline dan convex hull.
+
+    Jika building_outline diberikan, facet dibuat per chunk gedung
+    (iter_roof_facets) dan setiap facet membawa posisi baris outline gedungnya
+    di kolom 'building'; selain itu seluruh raster dipoligonisasi sekaligus.
+    Sebelum poligonisasi raster dibersihkan dengan clean_classes; sieve_size
+    dalam piksel, None berarti min_area dibagi luas piksel dan 0 berarti tanpa
+    pembersihan.
+
+    Hasilnya hanya facet polygon. Midline (titik) dihitung dan disimpan ke
+    midlines_path hanya jika path tersebut diisi.
+    """
+    def update():
+        if pbar is not None:
+            pbar.update(1)
+
+    gsd = max(abs(transform.a), abs(transform.e))
+    tolerance = gsd
+    if sieve_size is None:
+        sieve_size = sieve_pixels(min_area, transform)
+
+    if building_outline is not None:
+        # Per building window: polygonize, filter, snap, midlines and convex hull per chunk
+        chunks = iter_roof_facets(classified_raster, transform, crs, building_outline, min_area,
+                                  workers=workers, sieve_size=sieve_size, midlines_path=midlines_path)
+        first = next(chunks, None)
+        if first is None:
+            gdf = gpd.GeoDataFrame({'geometry': [], 'class': [], 'building': []}, crs=crs)
+        else:
+            gdf = gpd.GeoDataFrame(pd.concat(chain([first], chunks), ignore_index=True), crs=crs)
+        for _ in range(4):
+            update()  # Polygons, filter, snap and midlines are all done per chunk
+        return gdf
+
+    # Remove small regions, then convert raster to polygons
+    polygons, values = raster_to_polygons(clean_classes(classified_raster, sieve_size), transform)
+    gdf = gpd.GeoDataFrame({'geometry': polygons, 'class': values}, crs=crs)
+    update()  # Update after conversion to polygons
+
+    # Filter out polygons with area < min_area
+    gdf = gdf[gdf.geometry.area >= min_area]
+    update()  # Update after filtering small polygons
+
+    # Snap geometries to intersection points
+    gdf['geometry'] = snap_to_intersections(gdf, tolerance)
+    update()  # Update after snapping intersections
+
+    # Create midlines between overlapping geometries as a separate point layer
+    if midlines_path:
+        write_midlines(create_midlines(gdf), midlines_path)
+    update()  # Update after creating midlines
+
+    # Apply convex hull to each geometry
+    gdf['geometry'] = gdf['geometry'].apply(lambda geom: geom.convex_hull)
+    return gdf.reset_index(drop=True)
+
+def process_raster(input_aspect, output_shp, min_area, sieve_size=None):
+    with tqdm(total=6, desc="Processing Raster", unit="step", **progress_options()) as pbar:
         
         with rasterio.open(input_aspect) as src:
             data_raster = src.read(1)
             classified_raster = classify_aspect(data_raster)
             pbar.update(1)  # Update after aspect classification
 
-            crs = src.crs
-            transform = src.transform
-            pixel_size_x, pixel_size_y = src.res
-            gsd = max(pixel_size_x, pixel_size_y)
-            tolerance = gsd
-
-            # Convert raster to polygons
-            polygons, values = raster_to_polygons(classified_raster, transform)
-            gdf = gpd.GeoDataFrame({'geometry': polygons, 'class': values}, crs=crs)
-            pbar.update(1)  # Update after conversion to polygons
-
-            # Filter out polygons with area < min_area
-            gdf = gdf[gdf.geometry.area >= min_area]
-            pbar.update(1)  # Update after filtering small polygons
-
-            # Snap geometries to intersection points
-            gdf['geometry'] = snap_to_intersections(gdf, tolerance)
-            pbar.update(1)  # Update after snapping intersections
-
-            # Create midlines between overlapping geometries
-            midlines = []
-            for i, geom1 in enumerate(gdf.geometry):
-                for geom2 in gdf.geometry[i + 1:]:
-                    midline = create_midline_between_geoms(geom1, geom2)
-                    if midline:
-                        midlines.append(midline)
-            pbar.update(1)  # Update after creating midlines
-
-            # Apply convex hull to each geometry and save results
-            gdf['geometry'] = gdf['geometry'].apply(lambda geom: geom.convex_hull)
-            midline_gdf = gpd.GeoDataFrame(geometry=midlines, crs=gdf.crs)
-            result_gdf = gpd.GeoDataFrame(pd.concat([gdf, midline_gdf], ignore_index=True), crs=gdf.crs)
-            result_gdf.to_file(output_shp, driver='ESRI Shapefile')
-            pbar.update(1)  # Update after saving results
\ No newline at end of file
+            result_gdf = classes_to_polygons(classified_raster, src.transform, src.crs, min_area, pbar,
+                                             sieve_size=sieve_size, midlines_path=midline_path(output_shp))
+
+        # Save results
+        result_gdf.to_file(output_shp, driver='ESRI Shapefile')
+        pbar.update(1)  # Update after saving results
+
+def process_classified_raster(classified_raster, profile, output_shp, min_area, sieve_size=None):
+    """process_raster untuk raster kelas uint8 dari file1.process_aspect_classes (tanpa GeoTIFF aspect)."""
+    with tqdm(total=5, desc="Processing Raster", unit="step", **progress_options()) as pbar:
+        result_gdf = classes_to_polygons(classified_raster, profile["transform"], profile["crs"], min_area, pbar,
+                                         sieve_size=sieve_size, midlines_path=midline_path(output_shp))
+        result_gdf.to_file(output_shp, driver='ESRI Shapefile')
+        pbar.update(1)  # Update after saving results
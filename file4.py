@@ -1,73 +1,150 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
+from metrics import progress_options
+import numpy as np
+import pandas as pd
 import geopandas as gpd
-from shapely.geometry import LineString, Polygon
-from shapely.ops import unary_union, snap
-
-def process_union_clip(roof_structure_path, building_outline_path, output_union_path):
-    with tqdm(total=6, desc="Processing Union and Clip", unit="step") as pbar:
-        # Langkah 1: Baca file SHP dari roof_structure dan building_outline
-        roof_structure = gpd.read_file(roof_structure_path)
-        building_outline = gpd.read_file(building_outline_path)
-        pbar.update(1)
+import shapely
 
-        # Langkah 2: Memperbaiki geometri dengan buffer untuk geometri yang bermasalah
-        def safe_buffer(geom, buffer_distance, boundary_geom):
-            """
-            Menghasilkan buffer aman yang tidak melebihi boundary_geom.
-            """
-            if geom and geom.is_valid:
-                buffered = geom.buffer(buffer_distance)
-                if buffered.is_valid:
-                    # Batasi hasil buffer dengan boundary geometry
-                    return buffered.intersection(boundary_geom)
-            return None
-
-        building_union = unary_union(building_outline.geometry)  # Gabungkan seluruh outline untuk batasan
-
-        roof_structure['geometry'] = roof_structure['geometry'].apply(
-            lambda geom: safe_buffer(geom, 0, building_union) if geom else None)
-        building_outline['geometry'] = building_outline['geometry'].apply(
-            lambda geom: safe_buffer(geom, 0, building_union) if geom else None)
-        pbar.update(1)
+def process_union_clip(roof_structure_path, building_outline_path, output_union_path, workers=None):
+    # Langkah 1: Baca file SHP dari roof_structure dan building_outline
+    roof_structure = gpd.read_file(roof_structure_path)
+    building_outline = gpd.read_file(building_outline_path)
+
+    result_union = union_clip(roof_structure, building_outline, workers=workers)
+    if result_union is None:
+        return
+
+    # Menyimpan hasil union ke file shapefile baru
+    try:
+        result_union.to_file(output_union_path, driver="ESRI Shapefile")
+        print("Operasi Union dan Clip selesai!")
+    except Exception as e:
+        print(f"Error saving file: {e}")
+
+def valid_geometries(gdf):
+    """Perbaiki geometri dengan buffer(0) lalu buang yang kosong atau tetap tidak valid."""
+    gdf = gdf[gdf.geometry.notnull()].copy()
+    gdf['geometry'] = shapely.buffer(gdf.geometry.values, 0)
+    return gdf[~gdf.geometry.is_empty & gdf.geometry.is_valid]
 
-        # Langkah 3: Menghapus geometri None atau invalid setelah buffering
-        roof_structure = roof_structure[roof_structure['geometry'].notnull() & roof_structure.is_valid]
-        building_outline = building_outline[building_outline['geometry'].notnull() & building_outline.is_valid]
+def union_clip(roof_structure, building_outline, id_column='id', workers=1, partition_size=256):
+    """
+    Clip struktur atap dengan outline gedung lalu union keduanya (di memori).
+
+    Setiap facet dipasangkan dengan outline asalnya (facet_outline_pairs),
+    di-snap hanya ke outline tersebut lalu dipotong menjadi satu potongan per
+    outline. Outline dibagi menjadi partisi berisi partition_size gedung yang
+    berdekatan (urutan kurva Hilbert); clip dan overlay union dijalankan per
+    partisi pada ProcessPoolExecutor (workers=None memakai semua core,
+    workers=1 serial) lalu hasilnya digabung, sehingga biaya naik linear
+    terhadap jumlah gedung.
+
+    Kolom id_column dari outline ikut ke setiap polygon hasil union. Potongan
+    atap yang tidak beririsan dengan outline mana pun mendapat id outline
+    terdekat, sehingga setiap facet tetap terkait dengan gedungnya.
+    """
+    with tqdm(total=4, desc="Processing Union and Clip", unit="step", **progress_options()) as pbar:
+        # Langkah 2-3: Memperbaiki geometri bermasalah dan membuang yang None/invalid
+        # Kolom id_column milik facet (mis. id "<i>_asli" dari cleann.runnn) diganti id outline
+        roof_structure = valid_geometries(roof_structure.drop(columns=id_column, errors='ignore')).reset_index(drop=True)
+        # Posisi baris di outline asli, sama dengan tag 'building' dari file2_new.iter_building_polygons
+        building_outline = valid_geometries(building_outline.reset_index(drop=True))
+        rows = building_outline.index.values
+        building_outline = building_outline.reset_index(drop=True)
         pbar.update(1)
 
-        # Langkah 4: Memastikan tidak ada overlap atau perpotongan yang tidak sesuai
+        # Langkah 4: Snap setiap facet ke outline miliknya saja, satu potongan per pasangan facet-outline
         try:
-            roof_structure['geometry'] = roof_structure['geometry'].apply(
-                lambda geom: snap(geom, building_union, tolerance=0.01))
-            building_outline['geometry'] = building_outline['geometry'].apply(
-                lambda geom: snap(geom, building_union, tolerance=0.01))
+            roof_index, outline_index = facet_outline_pairs(roof_structure, building_outline, rows)
+            outlines = building_outline.geometry.values[outline_index]
+            snapped = shapely.snap(roof_structure.geometry.values[roof_index], outlines, tolerance=0.01)
+            pieces = roof_structure.iloc[roof_index].drop(columns='building', errors='ignore').reset_index(drop=True)
+            pieces['geometry'] = shapely.buffer(shapely.intersection(snapped, outlines), 0)
+            pieces['_outline'] = outline_index
+            pieces = pieces[~pieces.geometry.is_empty & pieces.geometry.is_valid]
             pbar.update(1)
         except Exception as e:
             print(f"Error during snapping: {e}")
             return
 
-        # Langkah 5: Operasi Clip - memotong data roof_structure dengan building_outline
+        # Langkah 5-6: Clip dan union per partisi gedung yang berdekatan
         try:
-            roof_clipped = gpd.clip(roof_structure, building_outline)
-            roof_clipped['geometry'] = roof_clipped['geometry'].apply(
-                lambda geom: safe_buffer(geom, 0, building_union) if geom else None)
-            roof_clipped = roof_clipped[roof_clipped['geometry'].notnull() & roof_clipped.is_valid]
-            pbar.update(1)
-        except Exception as e:
-            print(f"Error during clipping: {e}")
-            return
+            order = np.argsort(building_outline.geometry.hilbert_distance().values, kind='stable')
+            partitions = [order[start:start + partition_size] for start in range(0, len(order), partition_size)]
+            piece_groups = pieces.groupby('_outline').indices
+            tasks = []
+            for partition in partitions:
+                rows = [piece_groups[i] for i in partition if i in piece_groups]
+                roof_part = pieces.iloc[np.concatenate(rows) if rows else []].drop(columns='_outline')
+                tasks.append((building_outline.iloc[partition], roof_part))
 
-        # Langkah 6: Operasi Union - Menggabungkan hasil clip dengan building_outline
-        try:
-            result_union = gpd.overlay(building_outline, roof_clipped, how="union")
+            if workers == 1 or len(tasks) <= 1:
+                results = list(map(_union_clip_partition, tasks))
+            else:
+                with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                    results = list(pool.map(_union_clip_partition, tasks))
+            result_union = gpd.GeoDataFrame(pd.concat(results, ignore_index=True), crs=building_outline.crs)
             pbar.update(1)
         except Exception as e:
             print(f"Error during union operation: {e}")
             return
 
-        # Menyimpan hasil union ke file shapefile baru
-        try:
-            result_union.to_file(output_union_path, driver="ESRI Shapefile")
-            print("Operasi Union dan Clip selesai!")
-        except Exception as e:
-            print(f"Error saving file: {e}")
+        if id_column in building_outline.columns:
+            result_union[id_column] = fill_missing_ids(result_union, building_outline, id_column)
+        pbar.update(1)
+
+        return result_union
+
+def facet_outline_pairs(roof_structure, building_outline, rows=None):
+    """
+    Pasangan (indeks facet, indeks outline) untuk clip, terurut per facet.
+
+    Facet dari file2_new.iter_building_polygons membawa posisi baris outline
+    asalnya di kolom 'building'; rows adalah posisi baris asli setiap outline
+    di building_outline (setelah outline tidak valid dibuang). Facet bertag
+    hanya dipasangkan dengan outline itu, sehingga bagian facet yang melewati
+    tepi outline tidak berpindah ke gedung tetangga. Facet tanpa tag (atau
+    dengan posisi yang sudah dibuang) dipasangkan dengan semua outline yang
+    disentuhnya lewat sindex.query.
+    """
+    tagged = np.zeros(len(roof_structure), dtype=bool)
+    outline_of = np.zeros(len(roof_structure), dtype=np.intp)
+    if 'building' in roof_structure.columns and rows is not None:
+        position = pd.Series(np.arange(len(rows)), index=rows)
+        matched = position.reindex(roof_structure['building'].values).values
+        tagged = ~np.isnan(matched)
+        outline_of[tagged] = matched[tagged]
+
+    untagged = np.flatnonzero(~tagged)
+    left, right = building_outline.sindex.query(roof_structure.geometry.values[untagged], predicate='intersects')
+    roof_index = np.concatenate([np.flatnonzero(tagged), untagged[left]])
+    outline_index = np.concatenate([outline_of[tagged], right])
+    order = np.lexsort((outline_index, roof_index))
+    return roof_index[order], outline_index[order]
+
+def _union_clip_partition(task):
+    """Worker: clip potongan atap dengan outline partisi lalu overlay union keduanya."""
+    building_outline, roof_structure = task
+    if roof_structure.empty:
+        return building_outline
+    roof_clipped = valid_geometries(gpd.clip(roof_structure, building_outline))
+    if roof_clipped.empty:
+        return building_outline
+    return gpd.overlay(building_outline, roof_clipped, how="union")
+
+def fill_missing_ids(result_union, building_outline, id_column='id'):
+    """Isi id yang kosong pada hasil union dengan id outline terdekat."""
+    ids = result_union[id_column].copy()
+    missing = ids.isna()
+    if missing.any():
+        nearest = gpd.sjoin_nearest(result_union.loc[missing, ['geometry']],
+                                    building_outline[[id_column, 'geometry']], how='left')
+        # Jika ada beberapa outline dengan jarak sama, ambil yang pertama
+        nearest = nearest[~nearest.index.duplicated()]
+        ids.loc[missing] = nearest[id_column]
+    if not ids.isna().any():
+        # Overlay mengubah id integer menjadi float karena ada nilai kosong
+        ids = ids.astype(building_outline[id_column].dtype)
+    return ids
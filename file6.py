@@ -1,50 +1,32 @@
 from tqdm import tqdm
+from metrics import progress_options
 import geopandas as gpd
 import rasterio
 import numpy as np
-from shapely.geometry import Polygon
-
-def save_obj(vertices, faces, filename="output.obj"):
-    with open(filename, 'w') as f:
-        # Tulis vertices
-        for v in vertices:
-            f.write(f"v {v[0]} {v[1]} {v[2]}\n")
-        # Tulis faces
-        for face in faces:
-            face_indices = ' '.join(str(idx + 1) for idx in face)
-            f.write(f"f {face_indices}\n")
-    print(f"File saved as {filename}")
+from height_sampler import load_heights, sample_heights
+from mesh_builder import extrude_rings, polygon_rings
+from obj_io import write_obj
 
 def generate_polygon_3d_model(shapefile_path: str, ohm_tif_path: str, output_obj_path: str):
     # Baca shapefile polygon
     gdf = gpd.read_file(shapefile_path)
 
+    # Hanya Polygon yang dijadikan face atap
+    polygons = gdf.geometry[gdf.geom_type == 'Polygon'].values
+
     # Buka file raster OHM
-    with rasterio.open(ohm_tif_path) as ohm:
-        vertices = []
-        faces = []
-        vertex_index = 0
+    with rasterio.open(ohm_tif_path) as ohm, tqdm(total=2, desc="Processing Polygons", unit="step", **progress_options()) as pbar:
+        # Baca band pertama satu kali untuk area semua polygon
+        heights = load_heights(ohm, gdf.total_bounds)
+
+        # Ambil nilai tinggi dari OHM untuk semua titik (x, y) sekaligus
+        coords, ring_index, _ = polygon_rings(polygons)
+        z, valid = sample_heights(heights, coords[:, 0], coords[:, 1])
+        pbar.update(1)
 
-        # Tambahkan progress bar untuk iterasi setiap polygon
-        with tqdm(total=len(gdf), desc="Processing Polygons", unit="polygon") as pbar:
-            for polygon in gdf.geometry:
-                if isinstance(polygon, Polygon):
-                    poly_vertices = []
-                    
-                    # Tambahkan progress bar untuk setiap koordinat pada polygon
-                    for x, y in tqdm(polygon.exterior.coords, desc="Processing Coordinates", leave=False):
-                        # Ambil nilai tinggi dari OHM pada titik (x, y)
-                        row, col = ohm.index(x, y)
-                        z = ohm.read(1)[row, col]  # Asumsi nilai ketinggian diambil dari band pertama
-                        vertices.append((x, y, z))
-                        poly_vertices.append(vertex_index)
-                        vertex_index += 1
-                    
-                    # Tambahkan polygon sebagai face
-                    faces.append(poly_vertices)
-                
-                # Perbarui progress bar setelah setiap polygon selesai diproses
-                pbar.update(1)
+        # Tambahkan setiap polygon sebagai face atap
+        mesh = extrude_rings(np.column_stack((coords[valid], z[valid])), ring_index[valid], walls=False)
+        pbar.update(1)
 
-        # Simpan hasil sebagai file OBJ
-        save_obj(vertices, faces, output_obj_path)
+    # Simpan hasil sebagai file OBJ
+    write_obj(mesh, output_obj_path)
@@ -0,0 +1,87 @@
+from collections import namedtuple
+import numpy as np
+from rasterio.transform import rowcol
+from rasterio.windows import Window
+
+from tiling import pixel_window
+
+# Band OHM yang sudah dibaca (utuh atau satu window) beserta posisinya di raster asal
+HeightGrid = namedtuple("HeightGrid", ["data", "transform", "row_off", "col_off", "nodata"])
+
+
+def load_heights(ohm, bounds=None, band=1):
+    """
+    Baca band OHM satu kali untuk dipakai semua sampling berikutnya.
+
+    Jika bounds diisi, hanya window yang menutupi bounds (plus 1 piksel untuk
+    interpolasi bilinear) yang dibaca.
+    """
+    if bounds is None:
+        window = Window(0, 0, ohm.width, ohm.height)
+    else:
+        window = pixel_window(bounds, ohm.transform, ohm.height, ohm.width, halo=1)
+    data = ohm.read(band, window=window)
+    return HeightGrid(data, ohm.transform, window.row_off, window.col_off, ohm.nodata)
+
+
+def sample_heights(grid, xs, ys, method="nearest"):
+    """
+    Ambil tinggi untuk semua koordinat sekaligus.
+
+    Koordinat diubah ke baris/kolom dalam satu langkah vektor (sama dengan
+    ohm.index). method "nearest" mengambil piksel yang memuat titik, "bilinear"
+    menginterpolasi empat pusat piksel terdekat dan hanya memakai tetangga
+    yang valid. Mengembalikan (heights, valid); titik di luar raster atau di
+    piksel nodata bernilai NaN dengan valid=False.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    data = grid.data
+    height, width = data.shape
+    heights = np.full(xs.shape, np.nan)
+    if xs.size == 0:
+        return heights, np.zeros(xs.shape, dtype=bool)
+
+    if grid.nodata is None or np.isnan(grid.nodata):
+        data_valid = ~np.isnan(data) if np.issubdtype(data.dtype, np.floating) else np.ones(data.shape, dtype=bool)
+    else:
+        data_valid = data != grid.nodata
+
+    if method == "nearest":
+        rows, cols = rowcol(grid.transform, xs, ys)
+        rows = np.asarray(rows) - grid.row_off
+        cols = np.asarray(cols) - grid.col_off
+        valid = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        valid[valid] = data_valid[rows[valid], cols[valid]]
+        heights[valid] = data[rows[valid], cols[valid]]
+        return heights, valid
+
+    if method != "bilinear":
+        raise ValueError(f"Metode interpolasi tidak dikenal: {method}")
+
+    # Posisi pecahan relatif terhadap pusat piksel
+    inverse = ~grid.transform
+    cols_f = inverse.a * xs + inverse.b * ys + inverse.c - grid.col_off - 0.5
+    rows_f = inverse.d * xs + inverse.e * ys + inverse.f - grid.row_off - 0.5
+    row0 = np.floor(rows_f).astype(np.int64)
+    col0 = np.floor(cols_f).astype(np.int64)
+    row_frac = rows_f - row0
+    col_frac = cols_f - col0
+
+    total = np.zeros(xs.shape)
+    weight_sum = np.zeros(xs.shape)
+    for d_row, d_col, weight in ((0, 0, (1 - row_frac) * (1 - col_frac)),
+                                 (0, 1, (1 - row_frac) * col_frac),
+                                 (1, 0, row_frac * (1 - col_frac)),
+                                 (1, 1, row_frac * col_frac)):
+        r = np.clip(row0 + d_row, 0, height - 1)
+        c = np.clip(col0 + d_col, 0, width - 1)
+        usable = data_valid[r, c] & (weight > 0)
+        total[usable] += weight[usable] * data[r[usable], c[usable]]
+        weight_sum[usable] += weight[usable]
+
+    # Titik harus berada di dalam raster yang dibaca
+    inside = (rows_f >= -0.5) & (rows_f < height - 0.5) & (cols_f >= -0.5) & (cols_f < width - 0.5)
+    valid = inside & (weight_sum > 0)
+    heights[valid] = total[valid] / weight_sum[valid]
+    return heights, valid
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from pipeline import run_shard, run_sharded_pipeline
+from raster_cache import open_raster
+from stage_cache import file_key
+from tocityjson import patch_buildings
+
+
+def manifest_path(output_cityjson):
+    """Manifest disimpan di samping file CityJSON yang dibuatnya."""
+    return f"{output_cityjson}.manifest.json"
+
+
+def outline_manifest(building_outline):
+    """id gedung -> hash geometri (WKB ternormalisasi) dan bounds, untuk dibandingkan antar run."""
+    geometries = shapely.normalize(building_outline.geometry.values)
+    wkbs = shapely.to_wkb(geometries)
+    bounds = shapely.bounds(geometries)
+    return {str(building_id): {"hash": hashlib.sha1(wkb).hexdigest(), "bounds": bound.tolist()}
+            for building_id, wkb, bound in zip(building_outline['id'], wkbs, bounds)}
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(path, params, buildings):
+    with open(path, 'w') as f:
+        json.dump({"params": params, "buildings": buildings}, f)
+
+
+def diff_outlines(old_buildings, new_buildings):
+    """Bandingkan dua manifest per id: (ditambah, diubah, dihapus)."""
+    added = [i for i in new_buildings if i not in old_buildings]
+    modified = [i for i in new_buildings if i in old_buildings and new_buildings[i]["hash"] != old_buildings[i]["hash"]]
+    removed = [i for i in old_buildings if i not in new_buildings]
+    return added, modified, removed
+
+
+def overlapping(building_outline, bounds, margin):
+    """Mask baris outline yang bounding box-nya (diperlebar margin) bersinggungan dengan salah satu bounds."""
+    if len(bounds) == 0:
+        return np.zeros(len(building_outline), dtype=bool)
+    boxes = shapely.buffer(shapely.box(*np.asarray(bounds).T), margin, join_style="mitre")
+    _, rows = building_outline.sindex.query(boxes, predicate='intersects')
+    mask = np.zeros(len(building_outline), dtype=bool)
+    mask[rows] = True
+    return mask
+
+
+def run_incremental(ohm_path, building_outline_path, output_cityjson, epsg,
+                    min_area=4, base_height=0, raster_cache_dir=None, workers=None,
+                    clean_threshold=None, clean_iterations=1, sieve_size=None):
+    """
+    Perbarui CityJSON hasil run sebelumnya hanya untuk gedung yang outline-nya berubah.
+
+    Outline baru dibandingkan dengan manifest run sebelumnya (id dan hash
+    geometri). Gedung yang ditambah atau diubah, beserta gedung yang window OHM-nya
+    bersinggungan dengan gedung tersebut (posisi baru maupun lama), dihitung ulang
+    dengan rantai shard (run_shard). Gedung tetangga di sekitar kumpulan itu ikut
+    sebagai konteks mask tetapi tidak ditulis ulang. CityJSON lama lalu di-patch:
+    gedung usang dan gedung yang dihapus dibuang, vertices dipadatkan dan gedung
+    baru ditambahkan. Jika manifest atau output belum ada, atau OHM/parameter
+    berubah, seluruh kota diproses dengan run_sharded_pipeline.
+    """
+    start = time.time()
+    with open_raster(ohm_path, raster_cache_dir) as ohm:
+        crs = ohm.crs
+        margin = 2 * max(abs(r) for r in ohm.res)  # Window dibulatkan ke piksel plus halo 1 piksel
+    building_outline = gpd.read_file(building_outline_path).to_crs(crs)
+    building_outline = building_outline[building_outline.geometry.notnull()].reset_index(drop=True)
+
+    params = {"ohm": file_key(ohm_path), "min_area": min_area, "base_height": base_height,
+              "clean_threshold": clean_threshold, "clean_iterations": clean_iterations, "sieve_size": sieve_size}
+    new_buildings = outline_manifest(building_outline)
+    manifest = load_manifest(manifest_path(output_cityjson))
+
+    if manifest is None or manifest["params"] != params or not os.path.exists(output_cityjson):
+        print("Manifest tidak ada atau parameter berubah, memproses seluruh kota")
+        run_sharded_pipeline(ohm_path, building_outline_path, output_cityjson, epsg,
+                             workers=workers, min_area=min_area, base_height=base_height,
+                             raster_cache_dir=raster_cache_dir, clean_threshold=clean_threshold,
+                             clean_iterations=clean_iterations, sieve_size=sieve_size)
+        save_manifest(manifest_path(output_cityjson), params, new_buildings)
+        return
+
+    old_buildings = manifest["buildings"]
+    added, modified, removed = diff_outlines(old_buildings, new_buildings)
+    print(f"Outline: {len(added)} ditambah, {len(modified)} diubah, {len(removed)} dihapus")
+    if not (added or modified or removed):
+        return
+
+    # Gedung terdampak: berubah, atau window-nya bersinggungan dengan posisi baru/lama gedung yang berubah
+    ids = building_outline['id'].astype(str).to_numpy()
+    changed = np.isin(ids, added + modified)
+    changed_bounds = ([new_buildings[i]["bounds"] for i in added + modified] +
+                      [old_buildings[i]["bounds"] for i in modified + removed])
+    affected = changed | overlapping(building_outline, changed_bounds, margin)
+    # Konteks: outline yang ikut menentukan mask window gedung terdampak
+    context = affected | overlapping(building_outline, shapely.bounds(building_outline.geometry.values[affected]), margin)
+
+    parts = {}
+    if affected.any():
+        parts = run_shard(ohm_path, building_outline[context], min_area, base_height, raster_cache_dir,
+                          clean_threshold=clean_threshold, clean_iterations=clean_iterations,
+                          sieve_size=sieve_size)
+    affected_ids = set(ids[affected])
+    meshes = [(building_id, mesh) for building_id, mesh in parts.items() if str(building_id) in affected_ids]
+
+    patch_buildings(output_cityjson, removed + sorted(affected_ids), meshes)
+    save_manifest(manifest_path(output_cityjson), params, new_buildings)
+    print(f"Pembaruan {len(meshes)} gedung selesai dalam {time.time() - start:.2f} detik")
@@ -1,9 +1,21 @@
+import numpy as np
 import trimesh
+from mesh_builder import fan_triangles, triangle_counts
 
-def make_obj_solid(input_file, output_file, use_convex_hull):
-    # Memuat mesh dari file input
-    scene_or_mesh = trimesh.load(input_file)
-    
+def mesh_from_arrays(mesh):
+    """
+    Buat Trimesh dari MeshArrays (triangulasi fan, seperti saat memuat OBJ).
+
+    Jika mesh punya face_groups, grup setiap face ikut ke segitiganya sebagai
+    face_attributes['group'].
+    """
+    face_attributes = None
+    if mesh.face_groups is not None:
+        face_attributes = {'group': np.repeat(mesh.face_groups, triangle_counts(mesh))}
+    return trimesh.Trimesh(vertices=mesh.vertices, faces=fan_triangles(mesh), face_attributes=face_attributes)
+
+def make_mesh_solid(scene_or_mesh, use_convex_hull):
+    """Jadikan mesh (atau Scene) solid di memori dan kembalikan Trimesh hasilnya."""
     # Jika hasilnya adalah Scene, gabungkan semua mesh menjadi satu
     if isinstance(scene_or_mesh, trimesh.Scene):
         print("File berisi beberapa mesh. Menggabungkan menjadi satu mesh.")
@@ -16,12 +28,18 @@ def make_obj_solid(input_file, output_file, use_convex_hull):
     if not mesh.is_watertight:
         print("Mesh tidak solid. Mencoba menutup lubang...")
         mesh.fill_holes()
-        
+
         # Jika mesh masih tidak solid, gunakan convex hull jika diizinkan
         if not mesh.is_watertight and use_convex_hull:
             print("Menggunakan convex hull untuk membuat model solid.")
             mesh = mesh.convex_hull  # Membuat mesh baru yang solid berbentuk convex
 
+    return mesh
+
+def make_obj_solid(input_file, output_file, use_convex_hull):
+    # Memuat mesh dari file input
+    mesh = make_mesh_solid(trimesh.load(input_file), use_convex_hull)
+
     # Menyimpan mesh solid ke file output
     mesh.export(output_file)
     print(f"File {output_file} telah disimpan dengan mesh yang solid.")
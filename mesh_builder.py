@@ -0,0 +1,132 @@
+from collections import namedtuple
+import numpy as np
+import shapely
+
+# Mesh poligon dalam bentuk array: vertices (N, 3) float64, indeks semua face
+# digabung dalam satu array int32, dan offsets (F + 1) gaya CSR sehingga face
+# ke-i adalah faces[offsets[i]:offsets[i + 1]]. face_groups (opsional) berisi
+# nomor grup per face, misalnya baris GeoDataFrame asal face tersebut.
+MeshArrays = namedtuple("MeshArrays", ["vertices", "faces", "offsets", "face_groups"], defaults=(None,))
+
+
+def empty_mesh():
+    return MeshArrays(np.empty((0, 3)), np.empty(0, dtype=np.int32), np.zeros(1, dtype=np.int64))
+
+
+def from_triangles(vertices, triangles, face_groups=None):
+    """MeshArrays dari vertices dan array segitiga (T, 3), misalnya dari Trimesh."""
+    triangles = np.asarray(triangles, dtype=np.int32).reshape(-1, 3)
+    offsets = np.arange(len(triangles) + 1, dtype=np.int64) * 3
+    return MeshArrays(np.asarray(vertices, dtype=np.float64), triangles.ravel(), offsets, face_groups)
+
+
+def polygon_rings(geometries):
+    """
+    Ambil koordinat ring luar semua Polygon/MultiPolygon sekaligus.
+
+    Mengembalikan (coords, ring_index, ring_geometry): coords (M, 2) berisi
+    titik semua ring berurutan (titik penutup ikut), ring_index (M,) nomor
+    ring tiap titik, dan ring_geometry posisi geometri asal tiap ring.
+    Geometri selain Polygon/MultiPolygon diabaikan.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    type_id = shapely.get_type_id(geometries)
+    polygonal = (type_id == 3) | (type_id == 6)  # Polygon, MultiPolygon
+    polygons, ring_geometry = shapely.get_parts(geometries[polygonal], return_index=True)
+    ring_geometry = np.flatnonzero(polygonal)[ring_geometry]
+    coords, ring_index = shapely.get_coordinates(shapely.get_exterior_ring(polygons), return_index=True)
+    return coords, ring_index, ring_geometry
+
+
+def extrude_rings(xyz, ring_index, base_height=0, roof=True, walls=True, ring_groups=None):
+    """
+    Bangun atap, ring dasar dan dinding untuk semua ring dalam satu langkah vektor.
+
+    xyz (M, 3) adalah titik atap yang valid, dikelompokkan per ring menurut
+    ring_index (naik). Setiap ring menghasilkan ring atap, ring dasar pada
+    base_height (jika walls), satu face atap (jika roof dan ring memiliki
+    setidaknya 3 titik) dan dua segitiga dinding per sisi. Urutan vertices dan
+    faces tetap per ring, sama seperti membangun ring satu per satu. Jika
+    ring_groups diisi (satu nilai per ring), setiap face mendapat grup ring-nya.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+    ring_index = np.asarray(ring_index, dtype=np.int64)
+    if len(xyz) == 0:
+        return empty_mesh()
+
+    counts = np.bincount(ring_index)
+    ring_start = np.cumsum(counts) - counts
+    pos = np.arange(len(xyz)) - ring_start[ring_index]  # Posisi titik dalam ring-nya
+
+    # Blok vertices per ring: ring atap lalu ring dasar
+    block = counts * (2 if walls else 1)
+    block_start = np.cumsum(block) - block
+    top_id = block_start[ring_index] + pos
+    vertices = np.empty((block.sum(), 3))
+    vertices[top_id] = xyz
+    if walls:
+        base_id = top_id + counts[ring_index]
+        vertices[base_id, :2] = xyz[:, :2]
+        vertices[base_id, 2] = base_height
+
+    # Jumlah face dan indeks per ring
+    roof_faces = (counts >= 3) if roof else np.zeros(len(counts), dtype=bool)
+    wall_faces = 2 * np.maximum(counts - 1, 0) if walls else np.zeros(len(counts), dtype=np.int64)
+    n_indices = counts * roof_faces + 3 * wall_faces
+    index_start = np.cumsum(n_indices) - n_indices
+    faces = np.empty(n_indices.sum(), dtype=np.int32)
+
+    has_roof = roof_faces[ring_index]
+    faces[index_start[ring_index[has_roof]] + pos[has_roof]] = top_id[has_roof]
+
+    if walls:
+        # Sisi dinding: titik yang masih punya titik berikutnya dalam ring yang sama
+        edge = np.flatnonzero(pos < counts[ring_index] - 1)
+        ring = ring_index[edge]
+        start = index_start[ring] + counts[ring] * roof_faces[ring] + 6 * pos[edge]
+        v0, v1 = top_id[edge], top_id[edge + 1]
+        b0, b1 = base_id[edge], base_id[edge + 1]
+        for k, ids in enumerate((v0, v1, b1, v0, b0, b1)):  # Dua segitiga per sisi
+            faces[start + k] = ids
+
+    # Ukuran face: face atap (jika ada) di awal blok ring, sisanya segitiga
+    n_faces = roof_faces + wall_faces
+    face_start = np.cumsum(n_faces) - n_faces
+    sizes = np.full(n_faces.sum(), 3, dtype=np.int64)
+    sizes[face_start[roof_faces]] = counts[roof_faces]
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    face_groups = None
+    if ring_groups is not None:
+        face_groups = np.repeat(np.asarray(ring_groups)[:len(counts)], n_faces)
+    return MeshArrays(vertices, faces, offsets, face_groups)
+
+
+def face_list(mesh):
+    """Pecah faces CSR menjadi list array indeks per face."""
+    return np.split(mesh.faces, mesh.offsets[1:-1]) if len(mesh.offsets) > 1 else []
+
+
+def triangle_counts(mesh):
+    """Jumlah segitiga hasil triangulasi fan untuk setiap face."""
+    return np.maximum(np.diff(mesh.offsets) - 2, 0)
+
+
+def fan_triangles(mesh):
+    """Triangulasi fan semua face (seperti saat memuat OBJ) menjadi array (T, 3)."""
+    n_triangles = triangle_counts(mesh)
+    first = np.repeat(mesh.offsets[:-1], n_triangles)
+    # Nomor segitiga dalam face-nya: 0, 1, ..., n - 3
+    step = np.arange(n_triangles.sum()) - np.repeat(np.cumsum(n_triangles) - n_triangles, n_triangles)
+    return np.column_stack((mesh.faces[first], mesh.faces[first + step + 1], mesh.faces[first + step + 2]))
+
+
+def to_pyvista_faces(mesh):
+    """Faces CSR ke format array face PyVista/VTK: [n, i0, ..., n, i0, ...]."""
+    sizes = np.diff(mesh.offsets)
+    out = np.empty(len(mesh.faces) + len(sizes), dtype=np.int64)
+    marker = mesh.offsets[:-1] + np.arange(len(sizes))
+    out[marker] = sizes
+    keep = np.ones(len(out), dtype=bool)
+    keep[marker] = False
+    out[keep] = mesh.faces
+    return out
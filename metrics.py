@@ -0,0 +1,197 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import psutil
+
+_PROGRESS = {
+    "disable": os.environ.get("TQDM_DISABLE", "").lower() not in ("", "0", "false"),
+    "mininterval": float(os.environ.get("TQDM_MININTERVAL", 0.1)),
+}
+
+
+def set_progress(enabled=True, mininterval=0.5):
+    """
+    Nyalakan/matikan semua progress bar tqdm, misalnya untuk batch job.
+
+    Setiap tqdm di pipeline memakai progress_options(). Variabel lingkungan
+    TQDM_* ikut diisi agar worker yang dibuat sesudahnya (spawn) memakai
+    pengaturan yang sama. mininterval membatasi frekuensi refresh bar.
+    """
+    os.environ["TQDM_DISABLE"] = "" if enabled else "1"
+    os.environ["TQDM_MININTERVAL"] = str(mininterval)
+    _PROGRESS.update(disable=not enabled, mininterval=mininterval)
+
+
+def progress_options():
+    """Argumen tqdm (disable, mininterval) sesuai set_progress()."""
+    return dict(_PROGRESS)
+
+
+class PeakRSS:
+    """
+    Sampel RSS proses di thread latar setiap interval detik dan simpan nilai tertingginya.
+
+    RSS yang disampel adalah jumlah proses ini dan semua proses anaknya
+    (worker ProcessPoolExecutor), sehingga tahap paralel ikut terukur.
+    """
+
+    def __init__(self, interval=0.01):
+        self.process = psutil.Process()
+        self.interval = interval
+        self.baseline = self.peak = self._rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _rss(self):
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.NoSuchProcess:  # Worker selesai di tengah sampling
+                pass
+        return rss
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+    @property
+    def peak_mb(self):
+        """RSS puncak absolut selama sampling (MB)."""
+        return self.peak / 2 ** 20
+
+    @property
+    def growth_mb(self):
+        """Kenaikan RSS puncak terhadap RSS saat sampling dimulai (MB)."""
+        return (self.peak - self.baseline) / 2 ** 20
+
+
+def item_counts(result):
+    """
+    Jumlah item dari hasil sebuah tahap: gedung, facet, vertices, faces atau piksel.
+
+    Dikenali dari bentuknya saja (tanpa mengimpor trimesh/geopandas): dict
+    building_id -> mesh, GeoDataFrame, MeshArrays/Trimesh, (raster, profile)
+    atau jumlah gedung (int).
+    """
+    if isinstance(result, bool) or result is None:
+        return {}
+    if isinstance(result, int):
+        return {"buildings": result}
+    if isinstance(result, dict):
+        meshes = list(result.values())
+        return {"buildings": len(meshes),
+                "vertices": sum(len(mesh.vertices) for mesh in meshes),
+                "faces": sum(_face_count(mesh) for mesh in meshes)}
+    if hasattr(result, "geometry") and hasattr(result, "columns"):
+        counts = {"facets": len(result)}
+        if "id" in result.columns:
+            counts["buildings"] = int(result["id"].nunique())
+        return counts
+    if hasattr(result, "vertices") and hasattr(result, "faces"):
+        return {"vertices": len(result.vertices), "faces": _face_count(result)}
+    if isinstance(result, tuple) and len(result) == 2 and hasattr(result[0], "shape"):
+        return {"pixels": int(result[0].size)}
+    return {}
+
+
+def _face_count(mesh):
+    offsets = getattr(mesh, "offsets", None)
+    return len(offsets) - 1 if offsets is not None else len(mesh.faces)
+
+
+class Metrics:
+    """
+    Pencatat metrik per tahap pipeline.
+
+    Setiap stage() mencatat waktu wall, waktu CPU (proses ini dan worker anak),
+    RSS puncak absolut (peak_rss_mb) dan kenaikannya sejak tahap dimulai
+    (rss_growth_mb), serta jumlah item, lalu menulisnya sebagai satu baris
+    JSON ke path (jika diisi). profiler='cprofile' menyimpan profil setiap tahap
+    ke profile_dir/<tahap>.prof (buka dengan pstats/snakeviz); profiler=
+    'pyinstrument' memakai sampling profiler pyinstrument jika terpasang dan
+    menyimpan laporan HTML.
+    """
+
+    def __init__(self, path=None, profiler=None, profile_dir=None, verbose=True):
+        if profiler not in (None, "cprofile", "pyinstrument"):
+            raise ValueError(f"Profiler tidak dikenal: {profiler}")
+        self.path = path
+        self.profiler = profiler
+        self.profile_dir = profile_dir or (os.path.dirname(os.path.abspath(path)) if path else ".")
+        self.verbose = verbose
+        self.records = []
+
+    @contextmanager
+    def _profile(self, name):
+        if self.profiler is None:
+            yield
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if self.profiler == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+        else:
+            from pyinstrument import Profiler  # Dependensi opsional
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(os.path.join(self.profile_dir, f"{name}.html"), "w") as f:
+                    f.write(profiler.output_html())
+
+    @contextmanager
+    def stage(self, name, message=None, **counts):
+        """
+        Ukur satu tahap; record (dict) yang di-yield bisa diisi jumlah item tambahan.
+
+        Jika message diisi, baris "<message> selesai dalam X detik" tetap dicetak
+        seperti sebelumnya.
+        """
+        record = {"stage": name, **counts}
+        process = psutil.Process()
+        cpu_start = process.cpu_times()
+        start = time.perf_counter()
+        with PeakRSS() as rss, self._profile(name):
+            yield record
+        cpu_end = process.cpu_times()
+        record.update(
+            wall_s=time.perf_counter() - start,
+            cpu_s=sum(cpu_end[:4]) - sum(cpu_start[:4]),  # user + system, termasuk proses anak
+            peak_rss_mb=rss.peak_mb,
+            rss_growth_mb=rss.growth_mb,
+            time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        )
+        self.records.append(record)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        if self.verbose and message:
+            print(f"{message} selesai dalam {record['wall_s']:.2f} detik")
+
+    def run(self, name, message, func, *args, **kwargs):
+        """Jalankan func(*args, **kwargs) sebagai satu tahap dan catat jumlah item hasilnya."""
+        with self.stage(name, message) as record:
+            result = func(*args, **kwargs)
+            record.update(item_counts(result))
+        return result
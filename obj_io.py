@@ -0,0 +1,191 @@
+import io
+import re
+import numpy as np
+import pandas as pd
+
+from mesh_builder import MeshArrays, empty_mesh
+
+CHUNK_ROWS = 100_000        # Baris per blok saat menulis
+CHUNK_BYTES = 64 * 2 ** 20  # Perkiraan ukuran blok baris saat membaca
+
+_FACE_SUFFIX = re.compile(rb"/\S*")  # Bagian vt/vn dari token face (v/vt/vn, v//vn)
+_TRAILING_SPACE = re.compile(rb"[ \t\r]+$", re.MULTILINE)
+_IS_WHITESPACE = np.zeros(256, dtype=bool)
+_IS_WHITESPACE[list(b" \t\r\n")] = True
+
+
+def write_obj(mesh, filename="output.obj"):
+    """
+    Simpan MeshArrays ke OBJ.
+
+    Baris diformat per blok dengan satu operasi % untuk ribuan baris sekaligus,
+    bukan satu f-string per vertex/face. Koordinat ditulis dengan repr float
+    (presisi penuh, sama seperti sebelumnya) dan indeks face mulai dari 1.
+    """
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    sizes = np.diff(mesh.offsets)
+    line_formats = {}
+
+    with open(filename, 'w') as f:
+        # Tulis vertices
+        for start in range(0, len(vertices), CHUNK_ROWS):
+            block = vertices[start:start + CHUNK_ROWS]
+            f.write(("v %r %r %r\n" * len(block)) % tuple(block.ravel().tolist()))
+
+        # Tulis faces; format baris dibuat sekali per jumlah sisi (arity)
+        for start in range(0, len(sizes), CHUNK_ROWS):
+            block_sizes = sizes[start:start + CHUNK_ROWS].tolist()
+            for size in set(block_sizes).difference(line_formats):
+                line_formats[size] = "f" + " %d" * size + "\n"
+            first = mesh.offsets[start]
+            last = mesh.offsets[start + len(block_sizes)]
+            fmt = "".join(line_formats[size] for size in block_sizes)
+            f.write(fmt % tuple((mesh.faces[first:last] + 1).tolist()))
+    print(f"File saved as {filename}")
+
+
+def _line_kinds(chars):
+    """
+    Jenis setiap baris dalam blok ('v', 'f' atau lainnya) dari byte pertamanya.
+
+    Mengembalikan (kinds, line_start, line_end) dalam posisi byte.
+    """
+    newline = np.flatnonzero(chars == ord("\n"))
+    line_start = np.concatenate(([0], newline + 1))
+    line_end = np.append(newline, len(chars))
+    # Tanpa menyalin blok: byte di luar blok dianggap newline (baris kosong)
+    has_first = line_start < len(chars)
+    has_second = line_start + 1 < len(chars)
+    first = np.where(has_first, chars[np.minimum(line_start, len(chars) - 1)], ord("\n"))
+    second = np.where(has_second, chars[np.minimum(line_start + 1, len(chars) - 1)], ord("\n"))
+    second_is_space = _IS_WHITESPACE[second] & (second != ord("\n"))
+    kinds = np.where(second_is_space, first, 0)
+    return kinds, line_start, line_end
+
+
+def _select_lines(text, kinds, line_start, line_end, kind):
+    """
+    Gabungkan semua baris berjenis kind dalam blok menjadi satu bytes.
+
+    Baris sejenis dalam OBJ biasanya berurutan, jadi yang disalin adalah potongan
+    per deretan baris, bukan per baris.
+    """
+    mask = kinds == ord(kind)
+    change = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    run_first = np.flatnonzero(change == 1)
+    run_last = np.flatnonzero(change == -1) - 1
+    return b"\n".join(text[line_start[first]:line_end[last]]
+                      for first, last in zip(run_first.tolist(), run_last.tolist())), int(mask.sum())
+
+
+def _read_table(text, usecols, **kwargs):
+    """
+    Parse kolom usecols dari blok baris sejenis dengan parser C pandas (kolom 0 = huruf penanda).
+
+    Pemisah satu spasi (spasi berlebih dilewati) jauh lebih cepat daripada
+    regex whitespace, yang hanya dipakai jika blok berisi tab.
+    """
+    sep = r"\s+" if b"\t" in text else " "
+    return pd.read_csv(io.BytesIO(text), sep=sep, skipinitialspace=True, header=None, engine="c",
+                       usecols=usecols, **kwargs).to_numpy()
+
+
+def _parse_vertices(text, n_lines):
+    """
+    Baris 'v x y z [...]' -> array (N, 3); komponen tambahan (warna) dibuang.
+
+    Angka diparse oleh parser C pandas langsung dari bytes, tanpa decode ke
+    str, dengan float_precision="round_trip" sehingga hasilnya sama persis
+    dengan float() (dan repr dari write_obj).
+    """
+    if n_lines == 0:
+        return np.empty((0, 3))
+    try:
+        values = _read_table(text, usecols=[1, 2, 3], dtype=np.float64, float_precision="round_trip")
+        if len(values) == n_lines and not np.isnan(values).any():
+            return values
+    except (pd.errors.ParserError, ValueError):
+        pass
+    # Jumlah komponen berbeda antar baris
+    return np.array([line.split()[1:4] for line in text.split(b"\n")], dtype=np.float64)
+
+
+def _parse_faces(text, n_lines):
+    """
+    Baris 'f ...' -> (indeks sesuai file, jumlah sisi per face).
+
+    Bagian vt/vn dibuang dengan satu regex untuk seluruh blok, lalu indeks
+    diparse oleh parser C pandas. Jika semua face punya jumlah sisi yang sama
+    hasilnya langsung satu tabel; untuk polygon campuran jumlah sisi per face
+    dihitung dari posisi awal token terhadap posisi newline dan sel kosong
+    dibuang.
+    """
+    if n_lines == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if b"/" in text:
+        text = _FACE_SUFFIX.sub(b"", text)
+    sides = len(text.split(b"\n", 1)[0].split()) - 1
+    # Jalur cepat hanya jika setiap baris punya tepat `sides` spasi tunggal: baris yang lebih
+    # panjang dari baris pertama akan dipotong usecols, dan baris lebih pendek menjadi NaN
+    if b"\t" not in text and text.count(b" ") == sides * n_lines:
+        table = _read_table(text, usecols=range(1, sides + 1))
+        if table.dtype.kind == "i" and len(table) == n_lines:
+            return table.ravel(), np.full(n_lines, sides)
+
+    text = _TRAILING_SPACE.sub(b"", text)  # Agar pandas tidak membaca kolom kosong di akhir baris
+    chars = np.frombuffer(text, dtype=np.uint8)
+    whitespace = _IS_WHITESPACE[chars]
+    token_start = np.flatnonzero(~whitespace & np.concatenate(([True], whitespace[:-1])))
+    line_end = np.append(np.flatnonzero(chars == ord("\n")), len(chars))
+    sizes = np.diff(np.searchsorted(token_start, line_end), prepend=0) - 1  # Tanpa token 'f'
+    columns = sizes.max() + 1
+    table = _read_table(text, names=range(columns), usecols=range(1, columns), dtype=np.float64)
+    filled = np.arange(table.shape[1]) < sizes[:, None]
+    return table[filled].astype(np.int64), sizes
+
+
+def _read_chunks(file):
+    """Baca file per blok sekitar CHUNK_BYTES yang selalu berakhir di akhir baris."""
+    while True:
+        text = file.read(CHUNK_BYTES)
+        if not text:
+            return
+        yield text + file.readline()
+
+
+def read_obj(file_path):
+    """
+    Baca OBJ menjadi MeshArrays.
+
+    File dibaca per blok byte; jenis baris ditentukan dari byte pertamanya,
+    baris v dan f dalam satu blok digabung lalu diparse sekali oleh parser C
+    pandas langsung dari bytes, bukan split() dan float()/int() per token.
+    Mendukung face v, v/vt, v//vn, v/vt/vn, indeks relatif (negatif) dan
+    polygon dengan jumlah sisi berbeda. Baris lain (vt, vn, o, g, usemtl,
+    komentar) diabaikan.
+    """
+    vertex_blocks, index_blocks, size_blocks = [], [], []
+    n_vertices = 0
+
+    with open(file_path, 'rb') as file:
+        for text in _read_chunks(file):
+            kinds, line_start, line_end = _line_kinds(np.frombuffer(text, dtype=np.uint8))
+            vertices = _parse_vertices(*_select_lines(text, kinds, line_start, line_end, "v"))
+            indices, sizes = _parse_faces(*_select_lines(text, kinds, line_start, line_end, "f"))
+
+            negative = indices < 0
+            if negative.any():
+                # Jumlah vertex sebelum setiap baris face, untuk indeks relatif
+                v_before = n_vertices + np.cumsum(kinds == ord("v"))[kinds == ord("f")]
+                indices[negative] += np.repeat(v_before, sizes)[negative] + 1
+
+            vertex_blocks.append(vertices)
+            index_blocks.append(indices - 1)
+            size_blocks.append(sizes)
+            n_vertices += len(vertices)
+
+    if not vertex_blocks:
+        return empty_mesh()
+    sizes = np.concatenate(size_blocks)
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    return MeshArrays(np.concatenate(vertex_blocks), np.concatenate(index_blocks).astype(np.int32), offsets)
@@ -0,0 +1,314 @@
+import os
+import sys
+import functools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import geopandas as gpd
+
+import cleann, file1, file2_new, file4, full_building, height_sampler, make_solid, mesh_builder, separate_obj, tiling
+from cleann import clean_overlaps
+from file1 import compute_aspect_classes
+from file2_new import classes_to_polygons
+from file4 import union_clip
+from full_building import build_building_model
+from make_solid import mesh_from_arrays, make_mesh_solid
+from mesh_builder import from_triangles
+from separate_obj import split_mesh_by_groups, split_mesh_to_parts
+from tocityjson import write_buildings
+from obj_io import write_obj
+from raster_cache import cached_band, open_raster
+from metrics import Metrics
+from stage_cache import DEFAULT_MAX_BYTES, file_key, frame_key, hash_key, open_stage_cache, source_key
+
+
+def checkpoint_path(checkpoint_dir, name):
+    """Path checkpoint untuk satu tahap, atau None jika checkpoint tidak diaktifkan."""
+    if checkpoint_dir is None:
+        return None
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    return os.path.join(checkpoint_dir, name)
+
+
+def stage_aspect(ohm_path, building_outline, checkpoint_dir=None, **kwargs):
+    """OHM -> (raster kelas aspect uint8, profile)."""
+    return compute_aspect_classes(ohm_path, building_outline,
+                                  debug_path=checkpoint_path(checkpoint_dir, 'output.tif'), **kwargs)
+
+
+def stage_roof_structure(classified, profile, min_area, building_outline, checkpoint_dir=None, workers=None,
+                         sieve_size=None):
+    """Raster kelas -> GeoDataFrame facet atap, disieve lalu dipoligonisasi per window gedung."""
+    roof_structure = classes_to_polygons(classified, profile["transform"], profile["crs"], min_area,
+                                         building_outline=building_outline, workers=workers, sieve_size=sieve_size,
+                                         midlines_path=checkpoint_path(checkpoint_dir, 'shp_output_midlines.shp'))
+    path = checkpoint_path(checkpoint_dir, 'shp_output.shp')
+    if path:
+        roof_structure.to_file(path, driver='ESRI Shapefile')
+    return roof_structure
+
+
+def stage_clean(roof_structure, threshold, iterations=1, checkpoint_dir=None):
+    """Facet atap -> facet atap tanpa overlap signifikan (cleann.clean_overlaps)."""
+    cleaned = clean_overlaps(roof_structure, threshold, iterations).drop(columns='merged', errors='ignore')
+    path = checkpoint_path(checkpoint_dir, 'bersihh.shp')
+    if path:
+        cleaned.to_file(path, driver='ESRI Shapefile')
+    return cleaned
+
+
+def stage_union(roof_structure, building_outline, checkpoint_dir=None, workers=None):
+    """Facet atap + outline gedung -> GeoDataFrame hasil clip dan union (partisi dijalankan paralel)."""
+    result_union = union_clip(roof_structure, building_outline.to_crs(roof_structure.crs), workers=workers)
+    if result_union is None:
+        raise RuntimeError("Operasi union dan clip gagal")
+    path = checkpoint_path(checkpoint_dir, 'union.shp')
+    if path:
+        result_union.to_file(path, driver='ESRI Shapefile')
+    return result_union
+
+
+def stage_building_model(result_union, ohm_path, base_height=0, checkpoint_dir=None, cache_dir=None):
+    """GeoDataFrame union -> MeshArrays model atap dan dinding."""
+    with open_raster(ohm_path, cache_dir) as ohm:
+        model = build_building_model(result_union, ohm, base_height)
+    path = checkpoint_path(checkpoint_dir, 'full_building.obj')
+    if path:
+        write_obj(model, path)
+    return model
+
+
+def stage_solid(model, use_convex_hull=False, checkpoint_dir=None):
+    """MeshArrays -> Trimesh solid."""
+    mesh = make_mesh_solid(mesh_from_arrays(model), use_convex_hull)
+    path = checkpoint_path(checkpoint_dir, 'lod2.obj')
+    if path:
+        mesh.export(path)
+    return mesh
+
+
+def stage_split(mesh, result_union, building_outline):
+    """
+    Trimesh solid -> dict building_id -> MeshArrays per gedung.
+
+    Setiap face membawa baris result_union asalnya (face_attributes['group']),
+    jadi pemisahan cukup dikelompokkan menurut id baris tersebut. Uji titik
+    dalam polygon terhadap outline hanya dipakai jika grup face tidak tersedia,
+    misalnya setelah convex hull.
+    """
+    groups = mesh.face_attributes.get('group')
+    if groups is not None and len(groups) == len(mesh.faces):
+        parts = split_mesh_by_groups(mesh, groups, result_union['id'].to_numpy())
+    else:
+        parts = split_mesh_to_parts(mesh, list(zip(building_outline['id'], building_outline.geometry)))
+    return {building_id: from_triangles(part.vertices, part.faces) for building_id, part in parts.items()}
+
+
+def stage_keys(ohm_path, outline_key, min_area=4, base_height=0, use_convex_hull=False,
+               clean_threshold=None, clean_iterations=1, sieve_size=None, **aspect_kwargs):
+    """
+    Kunci cache setiap tahap: hash input, parameter, kode tahap dan kunci tahap sebelumnya.
+
+    Kunci dirantai sehingga perubahan di satu tahap hanya membatalkan tahap itu
+    dan tahap sesudahnya. Penulis CityJSON tidak di-cache, jadi mengubahnya
+    tidak menjalankan ulang tahap raster. outline_key sebaiknya frame_key dari
+    outline (geometri, atribut termasuk id dan CRS), bukan kunci file .shp
+    saja. Kode wrapper stage_* di modul ini ikut menjadi bagian setiap kunci.
+    """
+    ohm_key = file_key(ohm_path)
+    pipeline = sys.modules[__name__]
+    keys = {}
+    keys['aspect'] = hash_key('aspect', ohm_key, outline_key, sorted(aspect_kwargs.items()),
+                              source_key(pipeline, file1, tiling, file2_new))
+    keys['roof'] = hash_key('roof', keys['aspect'], min_area, sieve_size, source_key(pipeline, file2_new))
+    keys['clean'] = hash_key('clean', keys['roof'], clean_threshold, clean_iterations,
+                             source_key(pipeline, cleann) if clean_threshold is not None else None)
+    keys['union'] = hash_key('union', keys['clean'], outline_key, source_key(pipeline, file4))
+    keys['model'] = hash_key('model', keys['union'], ohm_key, base_height,
+                             source_key(pipeline, full_building, height_sampler, mesh_builder))
+    keys['solid'] = hash_key('solid', keys['model'], use_convex_hull,
+                             source_key(pipeline, make_solid, mesh_builder))
+    keys['split'] = hash_key('split', keys['solid'], keys['union'], source_key(pipeline, separate_obj))
+    return keys
+
+
+def cached(cache, key, name, compute):
+    """Jalankan compute() lewat StageCache, atau langsung jika cache tidak diaktifkan."""
+    if cache is None:
+        return compute()
+    return cache.load_or_compute(key, compute, name)
+
+
+def run_pipeline(ohm_path, building_outline_path, output_cityjson, epsg,
+                 min_area=4, base_height=0, checkpoint_dir=None, raster_cache_dir=None, compact=False,
+                 stage_cache_dir=None, stage_cache_size=DEFAULT_MAX_BYTES, metrics=None,
+                 clean_threshold=None, clean_iterations=1, sieve_size=None):
+    """
+    Jalankan seluruh tahap LOD2 dengan serah terima data di memori.
+
+    Tiap tahap menerima dan mengembalikan array, GeoDataFrame atau mesh secara
+    langsung; file antara (output.tif, shp_output.shp, union.shp,
+    full_building.obj, lod2.obj) hanya ditulis jika checkpoint_dir diisi.
+    Mesh per gedung ditulis langsung ke CityJSON tanpa OBJ per gedung. Jika
+    raster_cache_dir diisi, OHM di-decode sekali ke cache memmap dan dipakai
+    bersama semua tahap. compact=True menulis CityJSON dengan vertices
+    terkuantisasi dan dilas tanpa indentasi.
+
+    Jika stage_cache_dir diisi, hasil setiap tahap disimpan di sana (di luar
+    folder temp) dengan kunci dari stage_keys, dibatasi stage_cache_size byte
+    (LRU). Tahap dievaluasi dari belakang: tahap yang hasilnya ada di cache
+    tidak meminta tahap sebelumnya, sehingga jika hanya penulis CityJSON yang
+    berubah seluruh tahap raster dilewati. Checkpoint hanya ditulis oleh tahap
+    yang benar-benar dijalankan.
+
+    Setiap tahap yang dijalankan diukur oleh metrics (metrics.Metrics: waktu,
+    CPU, RSS puncak, jumlah item, profiler opsional).
+
+    Jika clean_threshold diisi, facet atap yang overlap-nya melebihi
+    threshold dibersihkan (cleann.clean_overlaps) sebelum union dan clip.
+
+    Sebelum poligonisasi raster kelas dibersihkan dengan filter mayoritas dan
+    sieve (file2_new.clean_classes). sieve_size dalam piksel; None berarti
+    min_area dibagi luas piksel, 0 mematikan pembersihan.
+    """
+    metrics = metrics or Metrics()
+    building_outline = gpd.read_file(building_outline_path)
+    cache = open_stage_cache(stage_cache_dir, stage_cache_size)
+    keys = stage_keys(ohm_path, frame_key(building_outline), min_area, base_height,
+                      clean_threshold=clean_threshold, clean_iterations=clean_iterations,
+                      sieve_size=sieve_size) if cache else {}
+
+    @functools.cache
+    def aspect():
+        return cached(cache, keys.get('aspect'), 'aspect', lambda: metrics.run(
+            'aspect', "Pembuatan Aspect", stage_aspect, ohm_path, building_outline, checkpoint_dir,
+            cache_dir=raster_cache_dir))
+
+    @functools.cache
+    def roof_structure():
+        return cached(cache, keys.get('roof'), 'roof', lambda: metrics.run(
+            'roof', "Pembuatan shp dari Aspect", stage_roof_structure, *aspect(), min_area, building_outline,
+            checkpoint_dir, sieve_size=sieve_size))
+
+    @functools.cache
+    def cleaned_roof_structure():
+        if clean_threshold is None:
+            return roof_structure()
+        return cached(cache, keys.get('clean'), 'clean', lambda: metrics.run(
+            'clean', "Pembersihan geometry", stage_clean, roof_structure(), clean_threshold, clean_iterations,
+            checkpoint_dir))
+
+    @functools.cache
+    def result_union():
+        return cached(cache, keys.get('union'), 'union', lambda: metrics.run(
+            'union', "Perapihan geometry", stage_union, cleaned_roof_structure(), building_outline, checkpoint_dir))
+
+    @functools.cache
+    def model():
+        return cached(cache, keys.get('model'), 'model', lambda: metrics.run(
+            'model', "Pembuatan model obj LOD 2", stage_building_model, result_union(), ohm_path, base_height,
+            checkpoint_dir, raster_cache_dir))
+
+    @functools.cache
+    def solid():
+        return cached(cache, keys.get('solid'), 'solid', lambda: metrics.run(
+            'solid', "Membuat LOD 2 menjadi solid", stage_solid, model(), False, checkpoint_dir))
+
+    parts = cached(cache, keys.get('split'), 'split', lambda: metrics.run(
+        'split', "Pemisahan per ID LOD 2", stage_split, solid(), result_union(), building_outline))
+
+    metrics.run('cityjson', "Pembuatan CityJSON", write_buildings, parts.items(), output_cityjson, epsg, compact)
+
+
+def partition_outlines(building_outline, shards):
+    """Bagi outline gedung menjadi shard yang berdekatan secara spasial (urutan kurva Hilbert)."""
+    order = np.argsort(building_outline.geometry.hilbert_distance().values, kind='stable')
+    return [building_outline.iloc[index] for index in np.array_split(order, shards) if len(index)]
+
+
+def run_shard(ohm_path, shard_outline, min_area=4, base_height=0, raster_cache_dir=None,
+              stage_cache_dir=None, stage_cache_size=DEFAULT_MAX_BYTES, clean_threshold=None, clean_iterations=1,
+              sieve_size=None):
+    """
+    Jalankan rantai lengkap (aspect sampai mesh per gedung) untuk satu shard outline.
+
+    Aspect dihitung hanya pada window gedung dalam shard, dan raster kelas
+    dipotong ke bounding box shard sehingga memori worker sebanding dengan
+    luas shard. Mengembalikan dict building_id -> MeshArrays. Jika
+    stage_cache_dir diisi, hasil shard di-cache dengan kunci dari isi outline
+    shard, sehingga shard yang tidak berubah tidak dihitung ulang.
+    """
+    def compute():
+        classified, profile = stage_aspect(ohm_path, shard_outline, windowed=True, workers=1, crop=True,
+                                           cache_dir=raster_cache_dir)
+        roof_structure = stage_roof_structure(classified, profile, min_area, shard_outline, workers=1,
+                                              sieve_size=sieve_size)
+        if clean_threshold is not None:
+            roof_structure = stage_clean(roof_structure, clean_threshold, clean_iterations)
+        result_union = stage_union(roof_structure, shard_outline, workers=1)
+        model = stage_building_model(result_union, ohm_path, base_height, cache_dir=raster_cache_dir)
+        mesh = stage_solid(model)
+        return stage_split(mesh, result_union, shard_outline)
+
+    cache = open_stage_cache(stage_cache_dir, stage_cache_size)
+    if cache is None:
+        return compute()
+    key = stage_keys(ohm_path, frame_key(shard_outline), min_area, base_height, clean_threshold=clean_threshold,
+                     clean_iterations=clean_iterations, sieve_size=sieve_size, windowed=True, crop=True)['split']
+    return cache.load_or_compute(key, compute)
+
+
+def iter_shard_parts(pool, shard_args, window):
+    """
+    Jalankan run_shard untuk setiap argumen dan hasilkan (building_id, mesh) sesuai urutan shard.
+
+    Paling banyak `window` shard yang sedang berjalan atau menunggu ditulis;
+    shard berikutnya baru dikirim setelah hasil shard terdepan diambil, dan
+    future-nya langsung dilepas agar mesh-nya bisa dibebaskan setelah ditulis.
+    """
+    pending = deque()
+    for args in shard_args:
+        pending.append(pool.submit(run_shard, *args))
+        if len(pending) >= window:
+            yield from pending.popleft().result().items()
+    while pending:
+        yield from pending.popleft().result().items()
+
+
+def run_sharded_pipeline(ohm_path, building_outline_path, output_cityjson, epsg,
+                         workers=None, shards=None, min_area=4, base_height=0, raster_cache_dir=None,
+                         compact=False, stage_cache_dir=None, stage_cache_size=DEFAULT_MAX_BYTES, metrics=None,
+                         clean_threshold=None, clean_iterations=1, sieve_size=None):
+    """
+    Jalankan pipeline per shard gedung secara paralel pada ProcessPoolExecutor.
+
+    Gedung saling independen, jadi outline dibagi menjadi shard dan setiap
+    worker menjalankan rantai lengkap untuk shard-nya. Mesh per gedung dari semua
+    shard dikirim kembali ke proses utama lalu ditulis menjadi satu CityJSON;
+    untuk output .jsonl (CityJSONSeq) setiap shard langsung ditulis begitu
+    selesai. Paling banyak 2 x workers shard yang sudah dikirim ke pool tetapi
+    belum ditulis (iter_shard_parts), jadi proses utama tidak menyimpan
+    seluruh kota. Jika
+    raster_cache_dir diisi, OHM di-decode sekali sebelum pool dimulai dan
+    semua worker hanya me-memmap cache yang sama. compact sama seperti pada
+    run_pipeline; stage_cache_dir meng-cache hasil per shard (lihat run_shard).
+    metrics mencatat seluruh pemrosesan shard sebagai satu tahap; clean_threshold,
+    clean_iterations dan sieve_size sama seperti pada run_pipeline.
+    """
+    building_outline = gpd.read_file(building_outline_path)
+    workers = workers or os.cpu_count()
+    shards = shards or workers * 4  # Beberapa shard per worker agar beban seimbang
+
+    metrics = metrics or Metrics()
+    with metrics.stage('sharded', workers=workers) as record:
+        if raster_cache_dir is not None:
+            cached_band(ohm_path, raster_cache_dir)
+        shard_outlines = partition_outlines(building_outline, shards)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shard_args = ((ohm_path, shard_outline, min_area, base_height, raster_cache_dir, stage_cache_dir,
+                           stage_cache_size, clean_threshold, clean_iterations, sieve_size)
+                          for shard_outline in shard_outlines)
+            parts = iter_shard_parts(pool, shard_args, window=2 * workers)
+            total = write_buildings(parts, output_cityjson, epsg, compact)
+        record.update(shards=len(shard_outlines), buildings=total)
+    print(f"Pemrosesan dan penulisan {total} gedung dalam {len(shard_outlines)} shard selesai dalam {record['wall_s']:.2f} detik")
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.coords import BoundingBox
+from rasterio.crs import CRS
+from rasterio.transform import rowcol, array_bounds
+from rasterio.windows import Window, transform as window_transform
+
+
+def cache_key(raster_path, band=1):
+    """Kunci cache dari path absolut, mtime dan ukuran file sumber."""
+    stat = os.stat(raster_path)
+    source = f"{os.path.abspath(raster_path)}|{stat.st_mtime_ns}|{stat.st_size}|{band}"
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def cached_band(raster_path, cache_dir, band=1):
+    """
+    Decode satu band raster ke file .npy sekali, lalu buka sebagai memmap.
+
+    Decode dilakukan per blok ke file sementara lalu dipindah secara atomik,
+    sehingga beberapa proses yang membuka cache bersamaan tetap aman. Semua
+    pemanggil berikutnya (termasuk worker lain) hanya me-memmap file yang
+    sama tanpa menyalin data. Mengembalikan (array_memmap, meta).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = cache_key(raster_path, band)
+    array_path = os.path.join(cache_dir, f"{key}.npy")
+    meta_path = os.path.join(cache_dir, f"{key}.json")
+
+    if not (os.path.exists(array_path) and os.path.exists(meta_path)):
+        suffix = f".{os.getpid()}.tmp"
+        with rasterio.open(raster_path) as src:
+            meta = {
+                "width": src.width,
+                "height": src.height,
+                "dtype": src.dtypes[band - 1],
+                "nodata": src.nodata,
+                "crs": src.crs.to_wkt() if src.crs else None,
+                "transform": list(src.transform)[:6],
+                "profile": {k: v for k, v in src.profile.items() if k not in ("crs", "transform")},
+            }
+            out = np.lib.format.open_memmap(array_path + suffix, mode="w+",
+                                            dtype=meta["dtype"], shape=(src.height, src.width))
+            for _, window in src.block_windows(band):
+                out[window.toslices()] = src.read(band, window=window)
+            out.flush()
+            del out
+
+        with open(meta_path + suffix, "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + suffix, meta_path)
+        os.replace(array_path + suffix, array_path)
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return np.load(array_path, mmap_mode="r"), meta
+
+
+class CachedRaster:
+    """
+    Pengganti dataset rasterio (hanya baca, satu band) yang membaca dari memmap cache.
+
+    read() mengembalikan view ke memmap, jadi tidak ada salinan data per tahap
+    maupun per worker. Hanya band yang di-cache yang bisa dibaca.
+    """
+
+    def __init__(self, array, meta, band=1):
+        self.array = array
+        self.band = band
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self.nodata = meta["nodata"]
+        self.crs = CRS.from_wkt(meta["crs"]) if meta["crs"] else None
+        self.transform = Affine(*meta["transform"])
+        self.dtypes = (meta["dtype"],)
+        self._profile = meta["profile"]
+
+    @property
+    def profile(self):
+        # Salinan baru setiap kali, seperti dataset rasterio
+        return dict(self._profile, crs=self.crs, transform=self.transform)
+
+    @property
+    def bounds(self):
+        west, south, east, north = array_bounds(self.height, self.width, self.transform)
+        return BoundingBox(west, south, east, north)
+
+    @property
+    def res(self):
+        return abs(self.transform.a), abs(self.transform.e)
+
+    def index(self, x, y):
+        return rowcol(self.transform, x, y)
+
+    def window_transform(self, window):
+        return window_transform(window, self.transform)
+
+    def read(self, band=1, window=None, **kwargs):
+        if band != self.band:
+            raise ValueError(f"Cache hanya berisi band {self.band}, bukan band {band}")
+        if window is None:
+            return self.array
+        if not isinstance(window, Window):
+            window = Window.from_slices(*window)
+        return self.array[window.toslices()]
+
+    def close(self):
+        self.array = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_raster(raster_path, cache_dir=None, band=1):
+    """
+    Buka raster lewat cache memmap jika cache_dir diisi, selain itu dengan rasterio.open.
+
+    Dengan cache, hanya band yang diminta yang di-decode dan bisa dibaca.
+    """
+    if cache_dir is None:
+        return rasterio.open(raster_path)
+    return CachedRaster(*cached_band(raster_path, cache_dir, band), band=band)
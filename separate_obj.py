@@ -2,59 +2,144 @@ import shapefile
 import trimesh
 import numpy as np
 import os
-from shapely.geometry import shape, Point
+import pandas as pd
+import shapely
+from scipy import sparse
+from shapely.geometry import shape
 from tqdm import tqdm
+from metrics import progress_options
 
 
-def is_point_in_polygon(point, polygon, tolerance=0):
+def split_obj_by_shapefile(obj_file, shapefile_path, output_folder, tolerance=0.001):
     """
-    Check if a 2D point is within a polygon with optional buffering.
+    Split an OBJ file into smaller OBJ files based on the polygons in a shapefile.
     """
-    if len(point) < 2:
-        return False  # Skip invalid points
-    if tolerance > 0:
-        polygon = polygon.buffer(tolerance)
-    return polygon.contains(Point(point[0], point[1]))
+    # Load the OBJ file
+    mesh = trimesh.load(obj_file)
+    split_mesh_by_shapefile(mesh, shapefile_path, output_folder, tolerance)
 
 
-def split_obj_by_shapefile(obj_file, shapefile_path, output_folder, tolerance=0.001):
+def read_outlines(shapefile_path):
     """
-    Split an OBJ file into smaller OBJ files based on the polygons in a shapefile.
+    Read (building_id, polygon) pairs from a shapefile.
     """
-    os.makedirs(output_folder, exist_ok=True)
-
-    # Load the shapefile
     sf = shapefile.Reader(shapefile_path)
     print(f"Loaded shapefile with {len(sf)} features.")
+    return [(feature.record['id'], shape(feature.shape.__geo_interface__)) for feature in sf.shapeRecords()]
 
-    # Load the OBJ file
-    mesh = trimesh.load(obj_file)
+
+def split_mesh_by_shapefile(mesh, shapefile_path, output_folder, tolerance=0.001):
+    """
+    Split an in-memory mesh into per-building OBJ files based on the polygons in a shapefile.
+    """
+    split_mesh_by_outlines(mesh, read_outlines(shapefile_path), output_folder, tolerance)
+
+
+def split_mesh_by_outlines(mesh, outlines, output_folder, tolerance=0.001):
+    """
+    Split an in-memory mesh into per-building OBJ files based on (building_id, polygon) pairs.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+
+    for building_id, part in split_mesh_to_parts(mesh, outlines, tolerance).items():
+        # Save the resulting mesh
+        output_file = os.path.join(output_folder, f"{building_id}.obj")
+        part.export(output_file)
+
+    print("All OBJ files have been saved based on the shapefile.")
+
+
+def face_building_incidence(mesh, polygons, tolerance=0.001):
+    """
+    Sparse (faces x buildings) matrix marking faces with at least one vertex inside a building.
+
+    Each outline is buffered once, candidate (vertex, outline) pairs come from a
+    single STRtree query and are confirmed with one vectorized contains_xy call.
+    """
+    vertices = np.asarray(mesh.vertices)
+    faces = np.asarray(mesh.faces)
+    polygons = np.asarray(polygons, dtype=object)
+    if tolerance > 0:
+        polygons = shapely.buffer(polygons, tolerance)
+
+    # Candidate pairs by bounding box, then the exact point-in-polygon test
+    tree = shapely.STRtree(polygons)
+    vertex_idx, building_idx = tree.query(shapely.points(vertices[:, :2]))
+    inside = shapely.contains_xy(polygons[building_idx], vertices[vertex_idx, 0], vertices[vertex_idx, 1])
+    vertex_building = sparse.csr_matrix(
+        (np.ones(inside.sum(), dtype=np.int32), (vertex_idx[inside], building_idx[inside])),
+        shape=(len(vertices), len(polygons)))
+
+    # Faces x vertices incidence times vertices x buildings gives faces x buildings
+    face_vertex = sparse.csr_matrix(
+        (np.ones(faces.size, dtype=np.int32), (np.repeat(np.arange(len(faces)), faces.shape[1]), faces.ravel())),
+        shape=(len(faces), len(vertices)))
+    return (face_vertex @ vertex_building).tocsc()
+
+
+def split_mesh_to_parts(mesh, outlines, tolerance=0.001):
+    """
+    Split an in-memory mesh into per-building meshes based on (building_id, polygon) pairs.
+
+    A face belongs to every building that contains at least one of its vertices.
+    Returns a dict of building_id -> trimesh.Trimesh, in outline order. Buildings
+    without any faces are left out.
+    """
     vertices = np.array(mesh.vertices)
+    parts = {}
 
     # Check vertices dimensions
     if vertices.size == 0 or vertices.shape[1] < 2:
         print("Error: Vertices are empty or do not have enough dimensions.")
-        return
+        return parts
+
+    building_ids = [building_id for building_id, _ in outlines]
+    incidence = face_building_incidence(mesh, [polygon for _, polygon in outlines], tolerance)
+    incidence.sort_indices()
 
-    for feature in tqdm(sf.shapeRecords(), desc="Processing shapes", unit="feature", total=len(sf.shapeRecords())):
-        polygon_shape = shape(feature.shape.__geo_interface__)
-        building_id = feature.record['id']
+    # Group faces by building: column j of the CSC matrix lists the faces of building j
+    for j in tqdm(np.flatnonzero(np.diff(incidence.indptr)), desc="Processing shapes", unit="feature", **progress_options()):
+        face_index = incidence.indices[incidence.indptr[j]:incidence.indptr[j + 1]]
+        parts[building_ids[j]] = mesh.submesh([face_index], only_watertight=False)[0]
 
-        # Filter vertices that are valid for processing
-        vertex_mask = np.array([
-            is_point_in_polygon(vertex, polygon_shape, tolerance)
-            for vertex in vertices
-        ])
+    return parts
 
-        # Determine which faces should be included based on vertex_mask
-        face_mask = np.any(vertex_mask[mesh.faces], axis=1)
 
-        if np.any(face_mask):  # Only process if there are relevant faces
-            sub_meshes = mesh.submesh([face_mask], only_watertight=False)
-            combined_mesh = trimesh.util.concatenate(sub_meshes) if len(sub_meshes) > 1 else sub_meshes[0]
+def fill_missing_groups(faces, face_groups):
+    """
+    Give faces without a group (-1, e.g. added by fill_holes) the group of a face sharing a vertex.
+    """
+    face_groups = np.array(face_groups)
+    missing = face_groups < 0
+    if missing.any() and not missing.all():
+        vertex_group = np.full(faces.max() + 1, -1, dtype=face_groups.dtype)
+        vertex_group[faces[~missing]] = face_groups[~missing, None]
+        face_groups[missing] = vertex_group[faces[missing]].max(axis=1)
+    return face_groups
 
-            # Save the resulting mesh
-            output_file = os.path.join(output_folder, f"{building_id}.obj")
-            combined_mesh.export(output_file)
 
-    print("All OBJ files have been saved based on the shapefile.")
+def split_mesh_by_groups(mesh, face_groups, labels):
+    """
+    Split an in-memory mesh into per-building meshes using per-face group ids.
+
+    face_groups holds, for each face, a row position into labels (the building
+    id of that row). Faces are partitioned by label with one stable sort, so
+    rows sharing a building id end up in the same mesh. Returns a dict of
+    building_id -> trimesh.Trimesh in order of first appearance in labels.
+    """
+    faces = np.asarray(mesh.faces)
+    face_groups = fill_missing_groups(faces, face_groups)
+    codes, building_ids = pd.factorize(pd.Series(labels), use_na_sentinel=False)
+
+    # Faces still without a group are dropped
+    keep = np.flatnonzero(face_groups >= 0)
+    face_codes = codes[face_groups[keep]]
+    order = np.argsort(face_codes, kind='stable')
+    boundaries = np.flatnonzero(np.diff(face_codes[order])) + 1
+
+    parts = {}
+    for face_index in tqdm(np.split(keep[order], boundaries) if len(keep) else [],
+                           desc="Processing shapes", unit="feature", **progress_options()):
+        building_id = building_ids[codes[face_groups[face_index[0]]]]
+        parts[building_id] = mesh.submesh([face_index], only_watertight=False)[0]
+    return parts
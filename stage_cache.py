@@ -0,0 +1,119 @@
+import hashlib
+import inspect
+import os
+import pickle
+import pandas as pd
+import shapely
+
+DEFAULT_MAX_BYTES = 2 * 2 ** 30  # Batas ukuran cache tahap: 2 GB
+
+
+def file_key(path):
+    """Kunci file input dari path absolut, mtime dan ukuran (sama seperti cache raster)."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+def source_key(*modules):
+    """Kunci kode: isi file sumber modul tahap, agar perubahan kode membatalkan cache."""
+    digest = hashlib.sha1()
+    for module in modules:
+        with open(inspect.getsourcefile(module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def frame_key(gdf):
+    """Kunci isi GeoDataFrame: geometri (WKB), atribut, index dan CRS."""
+    digest = hashlib.sha1(str(gdf.crs).encode())
+    for wkb in shapely.to_wkb(gdf.geometry.values):
+        digest.update(wkb)
+    attributes = gdf.drop(columns=gdf.geometry.name)
+    digest.update(",".join(map(str, attributes.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(attributes, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def hash_key(*parts):
+    """Gabungkan nama tahap, parameter dan kunci tahap sebelumnya menjadi satu kunci."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+class StageCache:
+    """
+    Cache hasil tahap pipeline di disk, dikunci dengan hash input dan parameter.
+
+    Setiap entri adalah satu file pickle bernama menurut kuncinya. Entri ditulis
+    ke file sementara lalu dipindah secara atomik, sehingga beberapa proses
+    (misalnya worker shard) aman memakai folder yang sama. mtime entri
+    diperbarui setiap kali dibaca; jika total ukuran melebihi max_bytes, entri
+    yang paling lama tidak dipakai dihapus lebih dulu (LRU).
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """Kembalikan (True, nilai) jika kunci ada di cache, selain itu (False, None)."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # Tandai sebagai baru dipakai
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return False, None
+        return True, value
+
+    def put(self, key, value):
+        """Simpan nilai untuk kunci lalu jalankan eviction."""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Hapus entri yang paling lama tidak dipakai sampai total ukuran <= max_bytes."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Sudah dihapus proses lain
+            total -= size
+
+    def load_or_compute(self, key, compute, name=None):
+        """Ambil hasil dari cache atau hitung dengan compute() lalu simpan."""
+        hit, value = self.get(key)
+        if hit:
+            if name:
+                print(f"Tahap {name} diambil dari cache")
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+
+def open_stage_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """StageCache untuk cache_dir, atau None jika cache tahap tidak diaktifkan."""
+    if cache_dir is None:
+        return None
+    return StageCache(cache_dir, max_bytes)
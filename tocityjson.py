@@ -1,27 +1,31 @@
 import os
+import re
 import json
-import uuid
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
+from metrics import progress_options
+from mesh_builder import face_list
+from obj_io import read_obj
 
-def parse_obj(file_path):
-    """Parse OBJ file and extract vertices and faces."""
-    vertices = []
-    faces = []
-    
-    with open(file_path, 'r') as file:
-        for line in file:
-            parts = line.strip().split()
-            if not parts:
-                continue
-            if parts[0] == 'v':
-                # Vertex line
-                vertices.append([float(coord) for coord in parts[1:]])
-            elif parts[0] == 'f':
-                # Face line
-                face_indices = [int(index.split('/')[0]) - 1 for index in parts[1:]]
-                faces.append(face_indices)
-    
-    return vertices, faces
+def cityjson_materials():
+    """Materials shared by all buildings (roof/ground and wall)."""
+    return [
+        {
+            "name": "roofandground",
+            "ambientIntensity": 0.2,
+            "diffuseColor": [0.9, 0.1, 0.75],
+            "transparency": 0.0,
+            "isSmooth": False
+        },
+        {
+            "name": "wall",
+            "ambientIntensity": 0.4,
+            "diffuseColor": [0.1, 0.1, 0.9],
+            "transparency": 0.0,
+            "isSmooth": False
+        }
+    ]
 
 def create_cityjson_structure(geographical_extent, epsg):
     """Create the base CityJSON structure with specified extent."""
@@ -35,37 +39,30 @@ def create_cityjson_structure(geographical_extent, epsg):
         "CityObjects": {},
         "vertices": [],
         "appearance": {
-            "materials": [
-                {
-                    "name": "roofandground",
-                    "ambientIntensity": 0.2,
-                    "diffuseColor": [0.9, 0.1, 0.75],
-                    "transparency": 0.0,
-                    "isSmooth": False
-                },
-                {
-                    "name": "wall",
-                    "ambientIntensity": 0.4,
-                    "diffuseColor": [0.1, 0.1, 0.9],
-                    "transparency": 0.0,
-                    "isSmooth": False
-                }
-            ]
+            "materials": cityjson_materials()
         }
     }
 
-def add_building_to_cityjson(cityjson, building_id, vertices, faces, building_index):
-    """Add building geometry, semantics, and materials to CityJSON structure."""
-    vertex_offset = len(cityjson["vertices"])
-    cityjson["vertices"].extend(vertices)  # Append vertices to the global list
-    
+def building_city_object(building_id, mesh, building_index, vertex_offset=0, keep=None, lod=1):
+    """
+    Build the CityObject (geometry, semantics, materials) of one building from MeshArrays.
+
+    Semantics follow the original face order (roof, ground, walls). keep is the
+    mask of original faces still present in mesh after weld_vertices dropped
+    degenerate ones, so the remaining faces keep their surface types. lod is
+    written as given: a number for CityJSON 1.0, a string ("1") for 2.0.
+    """
     # Format faces and add to geometry
-    solid_geometry = [[[[vertex_offset + idx for idx in face]] for face in faces]]
+    solid_geometry = [[[face.tolist()] for face in face_list(mesh._replace(faces=mesh.faces + vertex_offset))]]
     
     # Prepare semantics and materials arrays with the correct number of elements
-    num_faces = len(faces)
-    semantics_values = [[0] * 1 + [1] * 1 + [2] * (num_faces - 2)]
-    material_values = [[0] * 1 + [0] * 1 + [1] * (num_faces - 2)]
+    num_faces = len(mesh.offsets) - 1 if keep is None else len(keep)
+    semantics_values = np.array([0] * 1 + [1] * 1 + [2] * (num_faces - 2))[:num_faces]
+    material_values = np.array([0] * 1 + [0] * 1 + [1] * (num_faces - 2))[:num_faces]
+    if keep is not None:
+        semantics_values, material_values = semantics_values[keep], material_values[keep]
+    semantics_values = [semantics_values.tolist()]
+    material_values = [material_values.tolist()]
     
     semantics = {
         "values": semantics_values,
@@ -79,7 +76,7 @@ def add_building_to_cityjson(cityjson, building_id, vertices, faces, building_in
     material = {"": {"values": material_values}}
     
     # Define building object
-    cityjson["CityObjects"][building_id] = {
+    return {
         "type": "Building",
         "attributes": {
             "level_0": building_index,
@@ -89,42 +86,407 @@ def add_building_to_cityjson(cityjson, building_id, vertices, faces, building_in
         },
         "geometry": [{
             "type": "Solid",
-            "lod": 1,
+            "lod": lod,
             "boundaries": solid_geometry,
             "semantics": semantics,
             "material": material
         }]
     }
 
-def save_cityjson(cityjson, output_path):
-    """Save CityJSON data to a JSON file."""
+def add_building_to_cityjson(cityjson, building_id, mesh, building_index):
+    """Add building geometry (MeshArrays), semantics, and materials to CityJSON structure."""
+    vertex_offset = len(cityjson["vertices"])
+    cityjson["vertices"].extend(mesh.vertices.tolist())  # Append vertices to the global list
+    cityjson["CityObjects"][building_id] = building_city_object(building_id, mesh, building_index, vertex_offset)
+
+def save_cityjson(cityjson, output_path, compact=False):
+    """Save CityJSON data to a JSON file (compact: no indentation or spaces)."""
     with open(output_path, 'w') as f:
-        json.dump(cityjson, f, indent=2)
+        if compact:
+            json.dump(cityjson, f, separators=(',', ':'))
+        else:
+            json.dump(cityjson, f, indent=2)
 
-def obj_to_cityjson(input_folder, output_file, epsg):
-    """Menggabungkan kumpulan file OBJ ke satu file CityJSON dengan ID unik."""
-    # Membuat struktur dasar CityJSON
-    cityjson = create_cityjson_structure([0, 0, 0, 0, 0, 0], epsg)  # Extent bisa diatur sesuai shapefile jika perlu
+SEQ_SCALE = 0.001  # Presisi koordinat hasil kuantisasi: milimeter
 
-    obj_files = [f for f in os.listdir(input_folder) if f.endswith('.obj')]
-    
-    # Iterasi file OBJ di folder input dengan tqdm
-    for index, obj_file in enumerate(tqdm(obj_files, desc="Processing OBJ files", unit="file")):
-        obj_path = os.path.join(input_folder, obj_file)
-        vertices, faces = parse_obj(obj_path)
-        
-        # Membuat ID unik untuk setiap building berdasarkan nama file atau UUID
-        building_id = obj_file.split('.')[0] if obj_file else str(uuid.uuid4())
-        
-        # Menambahkan bangunan ke CityJSON
-        add_building_to_cityjson(
-            cityjson,
-            building_id,
-            vertices,
-            faces,
-            index
-        )
-
-    # Menyimpan hasil CityJSON
-    save_cityjson(cityjson, output_file)
+def geographical_extent(vertices):
+    """[minx, miny, minz, maxx, maxy, maxz] of an (N, 3) vertex array."""
+    if len(vertices) == 0:
+        return [0, 0, 0, 0, 0, 0]
+    return np.concatenate((vertices.min(axis=0), vertices.max(axis=0))).tolist()
+
+def drop_degenerate_faces(faces, offsets):
+    """
+    Remove collapsed edges and degenerate faces from CSR faces.
+
+    Consecutive repeated indices (including last -> first) are merged first, so
+    a quad with one collapsed edge becomes a triangle. Faces that then still
+    repeat an index or have fewer than 3 indices are dropped. Returns (faces,
+    offsets, keep) with keep the mask of surviving faces.
+    """
+    sizes = np.diff(offsets)
+    face_ids = np.repeat(np.arange(len(sizes)), sizes)
+    # Index of the previous vertex in the same face (cyclic)
+    previous = np.arange(len(faces)) - 1
+    previous[offsets[:-1][sizes > 0]] = offsets[1:][sizes > 0] - 1
+    distinct = faces != faces[previous]
+
+    face_ids, faces = face_ids[distinct], faces[distinct]
+    order = np.lexsort((faces, face_ids))
+    repeated = (face_ids[order][1:] == face_ids[order][:-1]) & (faces[order][1:] == faces[order][:-1])
+    keep = np.bincount(face_ids, minlength=len(sizes)) >= 3
+    keep[face_ids[order][1:][repeated]] = False
+
+    kept = keep[face_ids]
+    new_sizes = np.bincount(face_ids[kept], minlength=len(sizes))[keep]
+    return faces[kept], np.concatenate(([0], np.cumsum(new_sizes))), keep
+
+def weld_vertices(vertices, faces, offsets, translate, scale=SEQ_SCALE):
+    """
+    Quantize vertices with the CityJSON transform and weld duplicates.
+
+    Vertices are merged only if they round to the same integer grid position;
+    this is not a distance tolerance, so two points less than one quantum
+    (scale) apart on either side of a cell edge stay separate. Faces that
+    become degenerate after re-indexing are removed (drop_degenerate_faces),
+    and only vertices still referenced by the remaining faces are kept.
+    Returns (integer vertices, faces, offsets, keep mask of original faces).
+    """
+    used, used_inverse = np.unique(faces, return_inverse=True)
+    quantized = np.round((vertices[used] - translate) / scale).astype(np.int64)
+    welded, welded_inverse = np.unique(quantized, axis=0, return_inverse=True)
+    faces, offsets, keep = drop_degenerate_faces(welded_inverse.ravel()[used_inverse], np.asarray(offsets))
+    used, faces = np.unique(faces, return_inverse=True)
+    return welded[used], faces.astype(np.int32), offsets, keep
+
+def weld_mesh(mesh, transform):
+    """weld_vertices for one building with a CityJSON transform: (integer vertices, MeshArrays, keep)."""
+    vertices, faces, offsets, keep = weld_vertices(mesh.vertices, mesh.faces, mesh.offsets,
+                                                   transform["translate"], transform["scale"][0])
+    return vertices, mesh._replace(faces=faces, offsets=offsets), keep
+
+def meshes_to_cityjson(meshes, output_file, epsg, compact=False, scale=SEQ_SCALE):
+    """
+    Tulis mesh per gedung (dict building_id -> MeshArrays) langsung dari memori ke satu file CityJSON.
+
+    Dengan compact=True vertices dikuantisasi dengan transform (scale/translate),
+    vertex duplikat dilas dan vertex yang tidak dipakai dibuang untuk seluruh
+    kota sekaligus, lalu file ditulis tanpa indentasi. geographicalExtent selalu
+    dihitung dari vertices yang sebenarnya.
+    """
+    cityjson = create_cityjson_structure([0, 0, 0, 0, 0, 0], epsg)
+    building_ids = [str(building_id) for building_id in meshes]
+    meshes = list(meshes.values())
+
+    # Offset vertex tiap gedung dari prefix sum jumlah vertex, lalu semua vertices digabung sekali
+    vertices = np.concatenate([mesh.vertices for mesh in meshes]) if meshes else np.empty((0, 3))
+    offsets = np.cumsum([0] + [len(mesh.vertices) for mesh in meshes]).tolist()
+
+    if not compact:
+        cityjson["vertices"] = vertices.tolist()
+        for index, (building_id, mesh) in enumerate(tqdm(zip(building_ids, meshes), total=len(meshes),
+                                                          desc="Processing buildings", unit="building", **progress_options())):
+            cityjson["CityObjects"][building_id] = building_city_object(building_id, mesh, index, offsets[index])
+        cityjson["metadata"]["geographicalExtent"] = geographical_extent(vertices)
+        save_cityjson(cityjson, output_file)
+        print(f"CityJSON saved to {output_file}")
+        return
+
+    # Gabungkan semua gedung agar vertex di dinding bersama ikut dilas
+    faces = np.concatenate([mesh.faces + offset for mesh, offset in zip(meshes, offsets)]) if meshes else np.empty(0, dtype=np.int32)
+    face_start = np.cumsum([0] + [len(mesh.offsets) - 1 for mesh in meshes])
+    element_start = np.cumsum([0] + [len(mesh.faces) for mesh in meshes])
+    face_offsets = np.concatenate([mesh.offsets[:-1] + start for mesh, start in zip(meshes, element_start)]
+                                  + [[element_start[-1]]])
+    used = vertices[np.unique(faces)]
+    translate = used.min(axis=0) if len(used) else np.zeros(3)
+    welded, faces, face_offsets, keep = weld_vertices(vertices, faces, face_offsets, translate, scale)
+    kept_start = np.concatenate(([0], np.cumsum(keep)))[face_start]
+
+    cityjson["transform"] = {"scale": [scale, scale, scale], "translate": translate.tolist()}
+    cityjson["metadata"]["geographicalExtent"] = geographical_extent(used)
+    cityjson["vertices"] = welded.tolist()
+    for index, (building_id, mesh) in enumerate(tqdm(zip(building_ids, meshes), total=len(meshes),
+                                                      desc="Processing buildings", unit="building", **progress_options())):
+        first, last = kept_start[index], kept_start[index + 1]
+        building_offsets = face_offsets[first:last + 1]
+        mesh = mesh._replace(faces=faces[building_offsets[0]:building_offsets[-1]],
+                             offsets=building_offsets - building_offsets[0])
+        cityjson["CityObjects"][building_id] = building_city_object(
+            building_id, mesh, index, keep=keep[face_start[index]:face_start[index + 1]])
+
+    save_cityjson(cityjson, output_file, compact=True)
     print(f"CityJSON saved to {output_file}")
+
+def cityjsonseq_header(epsg, translate, scale=SEQ_SCALE):
+    """First line of a CityJSONSeq stream: metadata and the shared vertex transform."""
+    return {
+        "type": "CityJSON",
+        "version": "2.0",
+        "transform": {
+            "scale": [scale, scale, scale],
+            "translate": [float(value) for value in translate]
+        },
+        "metadata": {
+            "referenceSystem": f"https://www.opengis.net/def/crs/EPSG/0/{epsg}"
+        },
+        "CityObjects": {},
+        "vertices": []
+    }
+
+def building_feature(building_id, mesh, building_index, transform):
+    """CityJSONFeature for one building, with its own local quantized and welded vertices."""
+    vertices, mesh, keep = weld_mesh(mesh, transform)
+    return {
+        "type": "CityJSONFeature",
+        "id": building_id,
+        "CityObjects": {building_id: building_city_object(building_id, mesh, building_index, keep=keep, lod="1")},
+        "vertices": vertices.tolist(),
+        "appearance": {"materials": cityjson_materials()}
+    }
+
+def write_cityjsonseq(meshes, output_file, epsg, translate=None, scale=SEQ_SCALE):
+    """
+    Tulis (building_id, MeshArrays) sebagai CityJSON Text Sequence (.city.jsonl) secara streaming.
+
+    Baris pertama berisi header dengan transform, lalu satu CityJSONFeature per
+    gedung langsung ditulis begitu gedung tersebut diterima, sehingga memori
+    hanya sebesar gedung terbesar jika meshes berupa generator. Jika translate
+    tidak diisi, titik minimum gedung pertama dipakai. Mengembalikan jumlah gedung.
+    """
+    header = None
+    count = 0
+    with open(output_file, 'w') as f:
+        for building_id, mesh in tqdm(meshes, desc="Writing CityJSONSeq", unit="building", **progress_options()):
+            if header is None:
+                if translate is None:
+                    translate = mesh.vertices.min(axis=0) if len(mesh.vertices) else [0, 0, 0]
+                header = cityjsonseq_header(epsg, translate, scale)
+                f.write(json.dumps(header, separators=(',', ':')) + "\n")
+            feature = building_feature(str(building_id), mesh, count, header["transform"])
+            f.write(json.dumps(feature, separators=(',', ':')) + "\n")
+            count += 1
+        if header is None:
+            f.write(json.dumps(cityjsonseq_header(epsg, [0, 0, 0] if translate is None else translate, scale), separators=(',', ':')) + "\n")
+    print(f"CityJSONSeq saved to {output_file}")
+    return count
+
+def _shift_boundaries(boundaries, offset):
+    """Add offset to every vertex index in nested CityJSON boundaries."""
+    if boundaries and isinstance(boundaries[0], int):
+        return [index + offset for index in boundaries]
+    return [_shift_boundaries(item, offset) for item in boundaries]
+
+def _boundary_indices(boundaries):
+    """All vertex indices in nested CityJSON boundaries, flattened."""
+    if boundaries and isinstance(boundaries[0], int):
+        return list(boundaries)
+    return [index for item in boundaries for index in _boundary_indices(item)]
+
+def _remap_boundaries(boundaries, mapping):
+    """Replace every vertex index i in nested CityJSON boundaries with mapping[i]."""
+    if boundaries and isinstance(boundaries[0], int):
+        return mapping[boundaries].tolist()
+    return [_remap_boundaries(item, mapping) for item in boundaries]
+
+def _iter_features(seq_path):
+    with open(seq_path) as f:
+        next(f)  # Header
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def cityjsonseq_to_cityjson(seq_path, output_file):
+    """
+    Gabungkan CityJSONSeq kembali menjadi satu file CityJSON.
+
+    File dibaca dua kali secara streaming: pertama untuk CityObjects (indeks
+    vertex digeser sesuai jumlah vertex sebelumnya), kedua untuk vertices,
+    sehingga memori tetap sebesar satu gedung. Vertices tetap dalam bentuk
+    integer dengan transform dari header. geographicalExtent dihitung dari
+    vertices (setelah transform) pada pembacaan kedua, jadi metadata ditulis
+    paling akhir. lod lama yang berupa angka ditulis sebagai string (CityJSON 2.0).
+    """
+    with open(seq_path) as f:
+        header = json.loads(f.readline())
+    header.pop("CityObjects", None)
+    header.pop("vertices", None)
+    metadata = header.pop("metadata", {})
+    header["appearance"] = {"materials": cityjson_materials()}
+
+    with open(output_file, 'w') as out:
+        out.write(json.dumps(header, separators=(',', ':'))[:-1] + ',"CityObjects":{')
+        offset = 0
+        first = True
+        for feature in tqdm(_iter_features(seq_path), desc="Merging CityObjects", unit="feature", **progress_options()):
+            for object_id, city_object in feature["CityObjects"].items():
+                for geometry in city_object.get("geometry", []):
+                    geometry["boundaries"] = _shift_boundaries(geometry["boundaries"], offset)
+                    if "lod" in geometry:
+                        geometry["lod"] = str(geometry["lod"])
+                out.write(("" if first else ",") + json.dumps(object_id) + ":" +
+                          json.dumps(city_object, separators=(',', ':')))
+                first = False
+            offset += len(feature["vertices"])
+
+        out.write('},"vertices":[')
+        first = True
+        low = np.full(3, np.inf)
+        high = np.full(3, -np.inf)
+        for feature in _iter_features(seq_path):
+            if feature["vertices"]:
+                vertices = np.asarray(feature["vertices"], dtype=np.float64)
+                low = np.minimum(low, vertices.min(axis=0))
+                high = np.maximum(high, vertices.max(axis=0))
+                out.write(("" if first else ",") + json.dumps(feature["vertices"], separators=(',', ':'))[1:-1])
+                first = False
+        if offset:
+            transform = header["transform"]
+            metadata["geographicalExtent"] = geographical_extent(
+                np.stack((low, high)) * transform["scale"] + np.asarray(transform["translate"]))
+        else:
+            metadata["geographicalExtent"] = geographical_extent(np.empty((0, 3)))
+        out.write('],"metadata":' + json.dumps(metadata, separators=(',', ':')) + '}')
+    print(f"CityJSON saved to {output_file}")
+
+def patch_cityjson(cityjson_path, remove_ids, meshes):
+    """
+    Perbarui file CityJSON yang sudah ada tanpa menulis ulang semua gedung dari mesh.
+
+    CityObjects dengan id di remove_ids (dan id gedung baru) dihapus, vertices
+    yang tidak lagi dipakai dibuang dan indeks boundaries dipadatkan, lalu
+    (building_id, MeshArrays) baru ditambahkan. Jika file memakai transform
+    (mode compact), vertices gedung baru dikuantisasi dan dilas dengan transform
+    yang sama. Mengembalikan jumlah gedung yang ditambahkan.
+    """
+    with open(cityjson_path) as f:
+        cityjson = json.load(f)
+    meshes = [(str(building_id), mesh) for building_id, mesh in meshes]
+    city_objects = cityjson["CityObjects"]
+    for building_id in set(map(str, remove_ids)).union(building_id for building_id, _ in meshes):
+        city_objects.pop(building_id, None)
+
+    # Padatkan vertices: hanya yang masih dirujuk gedung yang tersisa
+    vertices = np.asarray(cityjson["vertices"]).reshape(-1, 3)
+    geometries = [geometry for city_object in city_objects.values() for geometry in city_object.get("geometry", [])]
+    used = np.unique(np.asarray([index for geometry in geometries
+                                 for index in _boundary_indices(geometry["boundaries"])], dtype=np.int64))
+    mapping = np.full(len(vertices), -1, dtype=np.int64)
+    mapping[used] = np.arange(len(used))
+    for geometry in geometries:
+        geometry["boundaries"] = _remap_boundaries(geometry["boundaries"], mapping)
+    vertex_blocks = [vertices[used]]
+
+    # Tambahkan gedung baru setelah vertices yang tersisa
+    transform = cityjson.get("transform")
+    offset = len(used)
+    next_index = max((city_object.get("attributes", {}).get("level_0", -1)
+                      for city_object in city_objects.values()), default=-1) + 1
+    for index, (building_id, mesh) in enumerate(meshes, start=next_index):
+        keep = None
+        if transform:
+            building_vertices, mesh, keep = weld_mesh(mesh, transform)
+        else:
+            building_vertices = mesh.vertices
+        city_objects[building_id] = building_city_object(building_id, mesh, index, offset, keep)
+        vertex_blocks.append(building_vertices)
+        offset += len(building_vertices)
+
+    vertices = np.concatenate(vertex_blocks)
+    cityjson["vertices"] = vertices.tolist()
+    if transform:
+        vertices = vertices * transform["scale"] + np.asarray(transform["translate"])
+    cityjson["metadata"]["geographicalExtent"] = geographical_extent(vertices)
+    save_cityjson(cityjson, cityjson_path, compact=bool(transform))
+    print(f"CityJSON updated: {cityjson_path}")
+    return len(meshes)
+
+def patch_cityjsonseq(seq_path, remove_ids, meshes):
+    """
+    patch_cityjson untuk CityJSONSeq: baris feature lama disaring secara streaming
+    lalu feature gedung baru ditambahkan dengan transform dari header.
+    """
+    meshes = [(str(building_id), mesh) for building_id, mesh in meshes]
+    remove_ids = set(map(str, remove_ids)).union(building_id for building_id, _ in meshes)
+    tmp_path = f"{seq_path}.{os.getpid()}.tmp"
+    count = 0
+    with open(seq_path) as src, open(tmp_path, 'w') as out:
+        header_line = src.readline()
+        header = json.loads(header_line)
+        out.write(header_line)
+        for line in src:
+            if line.strip() and json.loads(line)["id"] not in remove_ids:
+                out.write(line)
+                count += 1
+        for index, (building_id, mesh) in enumerate(meshes, start=count):
+            feature = building_feature(building_id, mesh, index, header["transform"])
+            out.write(json.dumps(feature, separators=(',', ':')) + "\n")
+    os.replace(tmp_path, seq_path)
+    print(f"CityJSONSeq updated: {seq_path}")
+    return len(meshes)
+
+def patch_buildings(output_file, remove_ids, meshes):
+    """Pilih patch_cityjsonseq (.jsonl) atau patch_cityjson sesuai output, seperti write_buildings."""
+    if output_file.endswith('.jsonl'):
+        return patch_cityjsonseq(output_file, remove_ids, meshes)
+    return patch_cityjson(output_file, remove_ids, meshes)
+
+def write_buildings(meshes, output_file, epsg, compact=False):
+    """
+    Tulis (building_id, MeshArrays) ke CityJSONSeq jika output berakhiran .jsonl
+    (streaming, selalu terkuantisasi), selain itu ke satu file CityJSON.
+    Mengembalikan jumlah gedung.
+    """
+    if output_file.endswith('.jsonl'):
+        return write_cityjsonseq(meshes, output_file, epsg)
+    meshes = dict(meshes)
+    meshes_to_cityjson(meshes, output_file, epsg, compact)
+    return len(meshes)
+
+def obj_files(input_folder):
+    """
+    Daftar file OBJ di folder dengan urutan tetap (bukan urutan os.listdir).
+
+    Nama diurutkan secara natural sehingga 2.obj datang sebelum 10.obj.
+    """
+    files = [f for f in os.listdir(input_folder) if f.endswith('.obj')]
+    return sorted(files, key=lambda name: [(0, int(part), '') if part.isdigit() else (1, 0, part)
+                                           for part in re.split(r'(\d+)', name)])
+
+def _read_building_obj(obj_path):
+    """Worker: baca satu OBJ gedung menjadi MeshArrays."""
+    return read_obj(obj_path)
+
+def iter_obj_meshes(input_folder, workers=None):
+    """
+    Baca file OBJ di folder sebagai (building_id, MeshArrays) dalam urutan obj_files.
+
+    Parsing dibagi ke ProcessPoolExecutor (workers=None memakai semua core,
+    workers=1 membaca serial di proses ini). Hasil pool.map selalu kembali dalam
+    urutan file, sehingga output identik berapa pun jumlah worker.
+    """
+    files = obj_files(input_folder)
+    paths = [os.path.join(input_folder, obj_file) for obj_file in files]
+    building_ids = [obj_file.split('.')[0] for obj_file in files]
+    workers = workers or os.cpu_count()
+    progress = dict(total=len(files), desc="Processing OBJ files", unit="file", **progress_options())
+
+    if workers == 1 or len(files) <= 1:
+        yield from zip(building_ids, tqdm(map(_read_building_obj, paths), **progress))
+        return
+    # Beberapa file per tugas agar overhead antar proses kecil untuk puluhan ribu file kecil
+    chunksize = max(1, len(files) // (workers * 16))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        meshes = pool.map(_read_building_obj, paths, chunksize=chunksize)
+        yield from zip(building_ids, tqdm(meshes, **progress))
+
+def obj_to_cityjson(input_folder, output_file, epsg, compact=False, workers=None):
+    """
+    Menggabungkan kumpulan file OBJ ke satu file CityJSON dengan ID unik.
+
+    File OBJ diparse paralel (lihat iter_obj_meshes) dan digabung dengan offset
+    vertex dari prefix sum (lihat meshes_to_cityjson). Jika output berakhiran
+    .jsonl, gedung ditulis sebagai CityJSONSeq begitu hasilnya tersedia.
+    compact=True menulis vertices terkuantisasi dan dilas.
+    """
+    write_buildings(iter_obj_meshes(input_folder, workers), output_file, epsg, compact)
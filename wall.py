@@ -1,66 +1,37 @@
 from tqdm import tqdm
+from metrics import progress_options
 import geopandas as gpd
 import rasterio
 import numpy as np
 import pyvista as pv
+from height_sampler import load_heights, sample_heights
+from mesh_builder import extrude_rings, polygon_rings, to_pyvista_faces
 
 def generate_building_walls_obj(shapefile_path, ohm_tif_path, output_path, base_height=0):
     # Baca shapefile dan TIF
     shapefile = gpd.read_file(shapefile_path)
-    raster = rasterio.open(ohm_tif_path)
+    with rasterio.open(ohm_tif_path) as raster:
+        grid = load_heights(raster, shapefile.total_bounds)
     
-    # Persiapkan daftar untuk menyimpan mesh bangunan
-    walls = []
+    with tqdm(total=3, desc="Processing Buildings", unit="step", **progress_options()) as pbar:
+        # Koordinat ring luar semua Polygon dan MultiPolygon sekaligus
+        coords, ring_index, _ = polygon_rings(shapefile.geometry.values)
+        pbar.update(1)
 
-    # Iterasi melalui setiap geometri (contoh bangunan) dalam shapefile dengan progress bar
-    for _, row in tqdm(shapefile.iterrows(), total=len(shapefile), desc="Processing Buildings", unit="building"):
-        geom = row.geometry
-        
-        # Jika geometri adalah MultiPolygon, iterasi setiap Polygon di dalamnya
-        if geom.geom_type == 'MultiPolygon':
-            polygons = geom.geoms
-        elif geom.geom_type == 'Polygon':
-            polygons = [geom]  # Jika geometri adalah Polygon, masukkan ke dalam list
-        
-        # Iterasi melalui setiap Polygon
-        for polygon in polygons:
-            # Ambil koordinat dari tiap vertex
-            coords = np.array(polygon.exterior.coords)
-            
-            # Ambil elevasi (Z) dari raster untuk setiap koordinat dengan progress bar
-            heights = []
-            for x, y in tqdm(coords, desc="Sampling Heights", leave=False):
-                for val in raster.sample([(x, y)]):
-                    heights.append(val[0])  # Ambil ketinggian pada titik tersebut
-            
-            # Pastikan jumlah ketinggian sama dengan jumlah titik
-            if len(heights) != len(coords):
-                continue  # Skip jika ada data yang tidak sesuai
-            
-            # Buat dinding untuk setiap sisi poligon
-            for i in range(len(coords) - 1):
-                x1, y1 = coords[i]
-                x2, y2 = coords[i + 1]
-                z1 = heights[i]
-                z2 = heights[i + 1]
-                
-                # Definisikan empat titik sudut untuk dinding segitiga dari 0 ke ketinggian OHM
-                points = np.array([
-                    [x1, y1, base_height],  # Titik dasar 1
-                    [x2, y2, base_height],  # Titik dasar 2
-                    [x1, y1, z1],           # Titik tinggi 1
-                    [x2, y2, z2]            # Titik tinggi 2
-                ])
-                
-                # Buat mesh segitiga untuk dinding
-                faces = [[3, 0, 1, 2], [3, 1, 2, 3]]  # Buat dua segitiga untuk setiap sisi
-                walls.append((points, faces))
+        # Ambil elevasi (Z) dari raster untuk semua koordinat sekaligus
+        heights, valid = sample_heights(grid, coords[:, 0], coords[:, 1])
 
-    # Buat objek mesh PyVista untuk visualisasi
-    all_meshes = pv.PolyData()
-    for points, faces in tqdm(walls, desc="Building Meshes", unit="wall"):
-        mesh = pv.PolyData(points, faces)
-        all_meshes = all_meshes + mesh
+        # Lewati polygon jika ada titik di luar raster atau pada nodata
+        keep = ~np.isin(ring_index, ring_index[~valid])
+        pbar.update(1)
+
+        # Dinding dari 0 sampai ketinggian OHM, dua segitiga untuk setiap sisi
+        mesh = extrude_rings(np.column_stack((coords[keep], heights[keep])), ring_index[keep],
+                             base_height, roof=False)
+        pbar.update(1)
+
+    # Buat satu objek mesh PyVista untuk semua dinding
+    all_meshes = pv.PolyData(mesh.vertices, to_pyvista_faces(mesh))
 
     # Simpan sebagai file OBJ
     all_meshes.save(output_path, binary=False)
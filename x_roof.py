@@ -4,36 +4,53 @@ import geopandas as gpd
 from shapely.geometry import LineString, Polygon, MultiPolygon
 from rasterio.transform import Affine
 import gdal
+from functools import partial
+from tiling import run_tiled_file
 
 # ============================
 # 1. Fungsi Menghitung Aspect
 # ============================
-def calculate_aspect(dem_path, output_path):
+def aspect_kernel(dem, xres, yres, nodata):
+    """Hitung aspek (derajat, 0-360) untuk satu blok DEM."""
+    dem = dem.astype(float)
+
+    # Mengatasi nilai NoData
+    dem[dem == nodata] = np.nan
+
+    # Perhitungan aspek
+    gy, gx = np.gradient(dem, yres, xres)
+    aspect = np.arctan2(-gy, gx)
+    aspect_deg = np.degrees(aspect)
+    aspect_deg = (aspect_deg + 360) % 360
+    aspect_deg[np.isnan(dem)] = np.nan
+    return aspect_deg
+
+def calculate_aspect(dem_path, output_path, workers=None):
     """
     Menghitung aspek dari file raster input (DEM).
     
     Args:
         dem_path (str): Path ke file raster input (TIF).
         output_path (str): Path untuk menyimpan file raster aspek.
+        workers (int): Jumlah thread untuk mesin tile (None = semua core, 1 = serial).
     """
     # Membuka raster input
     with rasterio.open(dem_path) as src:
-        dem = src.read(1).astype(float)  # Membaca DEM
         transform = src.transform
         crs = src.crs
         profile = src.profile
+        nodata = src.nodata
+        if workers == 1:
+            dem = src.read(1)  # Membaca DEM
 
-    # Mengatasi nilai NoData
-    dem[dem == src.nodata] = np.nan
-
-    # Perhitungan aspek
     xres = transform.a
     yres = -transform.e
-    gy, gx = np.gradient(dem, yres, xres)
-    aspect = np.arctan2(-gy, gx)
-    aspect_deg = np.degrees(aspect)
-    aspect_deg = (aspect_deg + 360) % 360
-    aspect_deg[np.isnan(dem)] = np.nan
+    kernel = partial(aspect_kernel, xres=xres, yres=yres, nodata=nodata)
+    if workers == 1:
+        aspect_deg = kernel(dem)
+    else:
+        # Tile dengan halo 1 piksel, hasil identik dengan versi serial
+        aspect_deg = run_tiled_file(kernel, dem_path, np.float64, workers=workers)
 
     # Menyimpan raster aspek
     profile.update(